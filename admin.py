@@ -1,14 +1,15 @@
-from fastapi import Depends
 from sqlalchemy.orm import Session
 from models import User
-from database import SessionLocal, get_db
+from database import SessionLocal
 from auth import get_password_hash  # your bcrypt password hash function
 
 
-db: Session = SessionLocal()
+def seed_admin(db: Session) -> bool:
+    """Create the default admin user if it doesn't exist. Returns True when it was created."""
+    admin = db.query(User).filter(User.username == "admin").first()
+    if admin:
+        return False
 
-admin = db.query(User).filter(User.username == "admin").first()
-if not admin:
     new_admin = User(
         username="admin",
         email = "admin@123.com",
@@ -19,6 +20,12 @@ if not admin:
     )
     db.add(new_admin)
     db.commit()
-    print("Admin user created.")
-else:
-    print("Admin already exists.")
+    return True
+
+
+if __name__ == "__main__":
+    with SessionLocal() as db:
+        if seed_admin(db):
+            print("Admin user created.")
+        else:
+            print("Admin already exists.")
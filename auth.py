@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Department, Employee, User
 from schemas import UserCreate, UserLogin, TokenData,RefreshTokenRequest
-from database import get_db
-from security import create_refresh_token, get_password_hash, verify_password, create_access_token
+from database import get_async_db
+from security import create_refresh_token, get_password_hash, create_access_token, hash_password_async, password_hasher, verify_and_update_password
 from datetime import timedelta
 from jose import JWTError, jwt
+from lruCache import LRUCache
+import os
+import time
 
 router = APIRouter()
 
@@ -15,25 +19,55 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/loginSwagger/")
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 
+# Validated principals are cached so authenticated requests skip the users
+# lookup. A TTL of 0 turns the cache off.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))
+
+# token -> principal dict returned by get_current_user
+_token_cache = LRUCache(max_entries=AUTH_CACHE_MAX_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+# username -> True while the user is known to exist; dropping it invalidates
+# every cached token of that user
+_user_cache = LRUCache(max_entries=AUTH_CACHE_MAX_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(username: str):
+    """Forget a cached user, e.g. after it is deleted or its role changes."""
+    _user_cache.pop(username)
+
+
+def clear_auth_cache():
+    _token_cache.clear()
+    _user_cache.clear()
+
+
+async def _check_password(db: AsyncSession, db_user: User, password: str) -> bool:
+    valid, new_hash = await verify_and_update_password(password, db_user.hashed_password)
+    if valid and new_hash:
+        # Stored with an old cost factor, upgrade it while we have the password
+        db_user.hashed_password = new_hash
+        await db.commit()
+    return valid
+
 
 
 
 @router.post("/register/")
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    emp  = db.query(Employee).filter(
-    Employee.employee_number == user.username).first()
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    emp  = (await db.execute(select(Employee).where(
+    Employee.employee_number == user.username))).scalars().first()
     if not emp:
         raise HTTPException(status_code=400, detail="employee doesnt exist registered")
     
-    db_user = db.query(User).filter(User.email == user.email).first()
-    db_user1 = db.query(User).filter(User.username == user.username).first()
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
+    db_user1 = (await db.execute(select(User).where(User.username == user.username))).scalars().first()
     if db_user1:
         raise HTTPException(status_code=400, detail="user already registered")
     
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     role = ""
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password_async(user.password)
     if ("hr"==emp.role_code.lower()):
         role ="HR"
         
@@ -52,17 +86,18 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     ) 
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    invalidate_user(new_user.username)
+    await db.refresh(new_user)
 
     return {"message": "User registered successfully", "user_id": new_user.id}
 
 
 
 @router.post("/login/")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
+    if not db_user or not await _check_password(db, db_user, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     access_token = create_access_token(
@@ -85,13 +120,13 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 from fastapi import Form
 
 @router.post("/loginSwagger/")
-def loginSwaggerUI(
+async def loginSwaggerUI(
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = db.query(User).filter(User.email == username).first()
-    if not db_user or not verify_password(password, db_user.hashed_password):
+    db_user = (await db.execute(select(User).where(User.email == username))).scalars().first()
+    if not db_user or not await _check_password(db, db_user, password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     access_token = create_access_token(
@@ -113,7 +148,7 @@ def loginSwaggerUI(
 
 
 @router.post("/refresh_token")
-def refresh_token(req: RefreshTokenRequest, db: Session = Depends(get_db)):
+async def refresh_token(req: RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)):
     try:
         payload = jwt.decode(req.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
@@ -123,7 +158,7 @@ def refresh_token(req: RefreshTokenRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
     # Optional: Verify user still exists in DB
-    user = db.query(User).filter(User.username == username).first()
+    user = (await db.execute(select(User).where(User.username == username))).scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -143,7 +178,11 @@ def refresh_token(req: RefreshTokenRequest, db: Session = Depends(get_db)):
 
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    principal = _token_cache.get(token)
+    if principal is not None and _user_cache.get(principal["username"]):
+        return dict(principal)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -153,15 +192,34 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if username is None or role is None or department_code is None:
             raise HTTPException(status_code=401, detail="Invalid token data")
 
-        user = db.query(User).filter(User.username == username).first()
+        user = (await db.execute(select(User.id).where(User.username == username))).first()
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
        
-        return {"username": username, "role": role, "department_code": department_code}
+        principal = {"username": username, "role": role, "department_code": department_code}
+        if AUTH_CACHE_TTL_SECONDS > 0:
+            # Never keep a token past its own expiry
+            ttl = AUTH_CACHE_TTL_SECONDS
+            if payload.get("exp") is not None:
+                ttl = min(ttl, payload["exp"] - time.time())
+            if ttl > 0:
+                _token_cache.set(token, principal, ttl=ttl)
+                _user_cache.set(username, True)
+        return dict(principal)
 
     except JWTError:
         raise HTTPException(
             status_code=401,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"}
-        )
\ No newline at end of file
+        )
+
+
+
+@router.get("/auth/hash-pool")
+def get_hash_pool_stats(current_user: dict = Depends(get_current_user)):
+    role =current_user["role"]
+    if role not in ["ADMIN"]:
+        raise HTTPException(status_code=401, detail="No access")
+    # Queue depth of the bcrypt pool, for watching login bursts
+    return password_hasher.stats()
@@ -0,0 +1,89 @@
+"""
+Excel parsing benchmark: serial parsing against the process pool on a
+generated workbook of one employee form per sheet.
+
+    python benchmarks/excel_parse.py --sheets 5000 --workers 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from excelParser import iter_excel_employees, parse_excel_parallel, get_parse_pool, shutdown_parse_pool  # noqa: E402
+
+
+def generate_workbook(sheets: int, competencies: int = 10, seed: int = 1) -> bytes:
+    """
+    A workbook laid out like the evaluation forms HR uploads. Not write_only:
+    like Excel, the normal writer records each sheet's dimension, without it
+    openpyxl scans every sheet just to open the workbook.
+    """
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for n in range(sheets):
+        ws = workbook.create_sheet(f"Employee {n}")
+        ws.append(["Competency Evaluation Form"])
+        ws.append(["Employee Number", f"B{n:06d}", None, "Employee Name", f"Employee {n}"])
+        ws.append(["Job Code", f"J{n % 20}", None, "Reporting Employee Name", "Manager"])
+        ws.append(["Role Code", f"R{n % 10}", None, "Department & Cost Centre", ["IT", "HR", "Finance"][n % 3]])
+        ws.append([])
+        ws.append(["Competency", "Code", "Required Score", "RPL/APL"])
+        ws.append(["Rating scale", None, None, "RPL/APL"])
+        ws.append(["Functional competencies"])
+        for c in range(competencies):
+            if c == competencies // 2:
+                ws.append(["Behavioral competencies"])
+            ws.append([f"Competency {c}", f"C{c:03d}", f"{rng.randint(1, 5)}/5", None])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sheets", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    elapsed, content = timed(lambda: generate_workbook(args.sheets))
+    print(f"generated {args.sheets} sheets, {len(content) / 1e6:.1f} MB in {elapsed:.1f}s")
+
+    # Start the workers before timing, the app keeps its pool for its lifetime
+    pool = get_parse_pool(args.workers)
+    list(pool.map(abs, range(args.workers)))
+
+    serial, parallel = [], []
+    try:
+        for _ in range(args.runs):
+            elapsed, expected = timed(lambda: list(iter_excel_employees(BytesIO(content))))
+            serial.append(elapsed)
+            elapsed, result = timed(lambda: parse_excel_parallel(content, pool, args.workers))
+            parallel.append(elapsed)
+            assert result == expected, "parallel parse differs from serial parse"
+    finally:
+        shutdown_parse_pool()
+
+    print(f"{args.runs} runs, {args.workers} workers, {os.cpu_count()} CPUs (seconds)")
+    print(f"{'mode':<10}{'best':>10}{'sheets/s':>12}")
+    for mode, times in [("serial", serial), ("parallel", parallel)]:
+        print(f"{mode:<10}{min(times):>10.2f}{args.sheets / min(times):>12.0f}")
+    print(f"speedup: {min(serial) / min(parallel):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Cold start benchmark: how long a fresh worker takes to import the app, run
+the lifespan startup and answer its first request.
+
+Each run is a new Python process working on a copy of the database, so
+test.db is never modified.
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+from datetime import timedelta
+from fastapi.testclient import TestClient
+from security import create_access_token
+
+token = create_access_token({"sub": "admin", "role": "ADMIN", "department_code": "admin"}, timedelta(minutes=5))
+client = TestClient(main.app)
+before_startup = time.perf_counter()
+with client:
+    started = time.perf_counter()
+    response = client.get("/roles", headers={"Authorization": f"Bearer {token}"})
+    first_request = time.perf_counter()
+
+print(json.dumps({
+    "import": imported - start,
+    "startup": started - before_startup,
+    "first_request": first_request - started,
+    "status": response.status_code,
+    "pandas_loaded": "pandas" in sys.modules,
+}))
+"""
+
+
+def run_once(database: str) -> dict:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}")
+    env.pop("ASYNC_DATABASE_URL", None)
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    # The app prints its database settings on startup, the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--database", default=os.path.join(ROOT, "test.db"), help="SQLite file to copy for each run")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(args.runs):
+            database = os.path.join(tmp, "startup.db")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(database + suffix):
+                    os.remove(database + suffix)
+            if os.path.exists(args.database):
+                shutil.copyfile(args.database, database)
+            results.append(run_once(database))
+
+    print(f"{args.runs} cold starts (seconds)")
+    print(f"{'phase':<15}{'median':>10}{'min':>10}{'max':>10}")
+    for phase in ["import", "startup", "first_request"]:
+        values = [r[phase] for r in results]
+        print(f"{phase:<15}{statistics.median(values):>10.3f}{min(values):>10.3f}{max(values):>10.3f}")
+    print(f"first request status: {results[-1]['status']}")
+    print(f"pandas imported at startup: {any(r['pandas_loaded'] for r in results)}")
+
+
+if __name__ == "__main__":
+    main()
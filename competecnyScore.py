@@ -1,11 +1,16 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from auth import get_current_user
-from database import get_db
-from models import Competency, Department, Employee, EmployeeCompetency
+from database import get_async_db
+from dataVersion import bump_data_version_async
+from models import Competency, Department, Employee, EmployeeCompetency, EmployeeCompetencyScoreHistory
 from schemas import CompetencyCreate, CompetencyResponse, EmployeeCompetencyResponse
+from statsRollup import RollupDelta
+from pagination import KeysetParams, filter_employees, keyset_paginate, page_headers
 import schemas
  
 router = APIRouter()
@@ -54,10 +59,10 @@ router = APIRouter()
 #     return {"message": "Evaluation submitted successfully"}
 
 @router.post("/evaluations/{employee_number}")
-def submit_evaluation(
+async def submit_evaluation(
     employee_number: str,
     evaluation_data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     role =current_user["role"] 
@@ -69,10 +74,24 @@ def submit_evaluation(
     
    
     # Check if employee exists
-    employee = db.query(Employee).filter(Employee.employee_number == employee_number).first()
+    employee = (await db.execute(
+        select(Employee).where(Employee.employee_number == employee_number)
+    )).scalars().first()
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
+    rollup = RollupDelta()
+    history = []
+
+    # All of the employee's competency rows in one query
+    competencies = {}
+    for row in (await db.execute(
+        select(EmployeeCompetency)
+        .where(EmployeeCompetency.employee_number == employee_number)
+        .order_by(EmployeeCompetency.id)
+    )).scalars():
+        competencies.setdefault(row.competency_code, row)
+
     # Process each competency score
     for score in evaluation_data["scores"]:
         has_competency_code = "competency_code" in score
@@ -82,22 +101,38 @@ def submit_evaluation(
             continue
             
         # Update or create competency record
-        competency = db.query(EmployeeCompetency).filter(
-            EmployeeCompetency.employee_number == employee_number,
-            EmployeeCompetency.competency_code == score["competency_code"]
-        ).first()
+        competency = competencies.get(score["competency_code"])
         
         if competency:
             # Update existing record
+            rollup.remove(competency.competency_code, employee.department_code, competency.required_score, competency.actual_score)
+            history.append(EmployeeCompetencyScoreHistory(
+                employee_number=employee_number,
+                competency_code=competency.competency_code,
+                department_code=employee.department_code,
+                required_score=competency.required_score,
+                previous_score=competency.actual_score,
+                actual_score=score["actual_score"]
+            ))
             competency.actual_score = score["actual_score"]
-    evaluator_id=db.query(Employee).filter(Employee.employee_number==current_user["username"]).first()
+            rollup.add(competency.competency_code, employee.department_code, competency.required_score, competency.actual_score)
+    evaluator_id=(await db.execute(select(Employee).where(Employee.employee_number==current_user["username"]))).scalars().first()
     if not evaluator_id:
         raise HTTPException(status_code=404, detail="Evaluator not found")
     employee.evaluation_status = True
     employee.evaluation_by = evaluator_id.employee_name
-    employee.last_evaluated_date = datetime.utcnow()
+    evaluated_at = datetime.utcnow()
+    employee.last_evaluated_date = evaluated_at
+
+    # History rows are written in the same transaction as the scores
+    for entry in history:
+        entry.evaluated_by = evaluator_id.employee_number
+        entry.evaluated_at = evaluated_at
+    db.add_all(history)
     
-    db.commit()
+    await db.run_sync(rollup.apply)
+    await db.commit()
+    await bump_data_version_async("employees", "employee_competencies", "employee_competency_score_history")
     
     return {"message": "Evaluation submitted successfully"}
 
@@ -112,16 +147,34 @@ def submit_evaluation(
 
 @router.get("/employee-competencies", response_model=List[EmployeeCompetencyResponse])
 
-def get_all_employee_competencies(
-    db: Session = Depends(get_db),
+async def get_all_employee_competencies(
+    response: Response,
+    competency_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    evaluation_status: Optional[bool] = None,
+    page: KeysetParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     role =current_user["role"] 
     if role not in ["ADMIN", "HR","HOD"]:
         raise HTTPException(status_code=401, detail="No access") 
 
+    def page_of_competencies(session: Session):
+        query = session.query(EmployeeCompetency)
+        if competency_code is not None:
+            query = query.filter(EmployeeCompetency.competency_code == competency_code)
+        if department_code is not None or role_code is not None or evaluation_status is not None:
+            query = filter_employees(
+                query.join(Employee, Employee.employee_number == EmployeeCompetency.employee_number),
+                department_code, role_code, evaluation_status
+            )
+        return keyset_paginate(query, EmployeeCompetency.id, page)
 
-    return db.query(EmployeeCompetency).all()
+    employee_competencies, next_cursor = await db.run_sync(page_of_competencies)
+    response.headers.update(page_headers(next_cursor))
+    return employee_competencies
 
 
 
@@ -130,19 +183,19 @@ def get_all_employee_competencies(
 
 
 @router.get("/employee-competencies/{employee_number}")
-def get_employee_competencies(
+async def get_employee_competencies(
     employee_number: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):  
     role =current_user["role"] 
     if role not in ["HR","ADMIN","HOD","EMPLOYEE"]:
         raise HTTPException(status_code=401, detail="No access")  
     
-    if not db.query(Employee).filter(Employee.employee_number == employee_number).first():
+    if not (await db.execute(select(Employee.employee_number).where(Employee.employee_number == employee_number))).first():
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    competencies = db.query(
+    competencies = (await db.execute(select(
         EmployeeCompetency.competency_code,
         Competency.name,
         Competency.description,
@@ -150,9 +203,9 @@ def get_employee_competencies(
         EmployeeCompetency.actual_score
     ).join(
         Competency, EmployeeCompetency.competency_code == Competency.code
-    ).filter(
+    ).where(
         EmployeeCompetency.employee_number == employee_number
-    ).all()
+    ))).all()
     
     return [{
         "code": comp.competency_code,
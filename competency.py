@@ -1,10 +1,13 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from auth import get_current_user
 from database import get_db
-from models import Competency, Department, Employee, EmployeeCompetency
+from dataVersion import bump_data_version
+from models import Competency, Department, Employee, EmployeeCompetency, RoleCompetency
+from pagination import KeysetParams, keyset_paginate, page_headers
+from conditionalGet import conditional_get
 from schemas import CompetencyCreate, CompetencyResponse, EmployeeCompetencyResponse
 import schemas
 
@@ -35,19 +38,32 @@ def create_competency(
     
     db.add(new_competency)
     db.commit()
+    bump_data_version("competencies")
     db.refresh(new_competency)
     
     return new_competency
 
 
 
-@router.get("/competency", response_model=List[CompetencyResponse])
-def get_all_competencies(db: Session = Depends(get_db),current_user: dict = Depends(get_current_user)):
+@router.get("/competency", response_model=List[CompetencyResponse], dependencies=[conditional_get("competencies", "role_competencies")])
+def get_all_competencies(
+    response: Response,
+    role_code: Optional[str] = Query(None, description="Only competencies assigned to this role"),
+    page: KeysetParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)):
     
     role =current_user["role"] 
     if role not in ["HOD", "HR","ADMIN"]:
         raise HTTPException(status_code=401, detail="No access")  
-    return db.query(Competency).all()
+    query = db.query(Competency)
+    if role_code is not None:
+        query = query.join(RoleCompetency, RoleCompetency.competency_code == Competency.code).filter(
+            RoleCompetency.role_code == role_code
+        )
+    competencies, next_cursor = keyset_paginate(query, Competency.id, page)
+    response.headers.update(page_headers(next_cursor))
+    return competencies
 
 
 
@@ -77,6 +93,7 @@ def update_competency(
     db_competency.required_score = competency.required_score
 
     db.commit()
+    bump_data_version("competencies")
     db.refresh(db_competency)
     
     return db_competency
@@ -104,6 +121,7 @@ def delete_competency(
     
     db.delete(competency)
     db.commit()
+    bump_data_version("competencies")
     return {"message": "Competency deleted successfully"}
 
 
@@ -0,0 +1,54 @@
+import hashlib
+from fastapi import Depends, HTTPException, Request
+from auth import get_current_user
+from dataVersion import table_versions
+
+
+def _etag(request: Request, current_user: dict, tables) -> str:
+    # The same URL can return different bodies per Accept header and per
+    # role/department (HODs only see their own department), so those are
+    # part of the tag too
+    parts = [
+        request.url.path,
+        "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items())),
+        request.headers.get("accept", ""),
+        str(current_user.get("role")),
+        str(current_user.get("department_code")),
+        ",".join(f"{t}:{v}" for t, v in zip(tables, table_versions(*tables))),
+    ]
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def conditional_get(*tables: str):
+    """
+    Route dependency that tags GET responses with an ETag derived from the
+    data versions of the given tables. When the client's If-None-Match still
+    matches, a 304 is returned before the endpoint runs any query.
+    """
+    # A plain def: FastAPI runs it in the threadpool, so syncing the data
+    # versions here never blocks the event loop
+    def check(request: Request, current_user: dict = Depends(get_current_user)):
+        etag = _etag(request, current_user, tables)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        request.state.etag = etag
+
+    return Depends(check)
+
+
+async def etag_middleware(request: Request, call_next):
+    """Copy the tag computed by conditional_get onto successful responses."""
+    response = await call_next(request)
+    etag = getattr(request.state, "etag", None)
+    if etag and response.status_code == 200 and "etag" not in response.headers:
+        response.headers["ETag"] = etag
+    return response
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from typing import Dict, Tuple
+from sqlalchemy import insert, select, update
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from database import engine
+from models import DataVersion
+
+# Monotonically increasing per-table counters bumped by the write endpoints
+# after they commit. Anything derived from the data (cached responses, ETags)
+# is keyed on these, so a bump makes the old entries unreachable.
+#
+# The counters are persisted in the data_versions table so that every worker
+# sees every write. A worker sees its own writes immediately and re-reads the
+# table at most every DATA_VERSION_SYNC_SECONDS for writes made by the others.
+
+DATA_VERSION_SYNC_SECONDS = float(os.getenv("DATA_VERSION_SYNC_SECONDS", "1"))
+
+_lock = threading.Lock()
+_global_version = 0  # local counter, moves whenever any table version changes
+_table_versions = {}
+_synced_at = 0.0
+
+
+def _merge(rows):
+    global _global_version
+    with _lock:
+        changed = False
+        for name, version in rows:
+            if _table_versions.get(name) != version:
+                _table_versions[name] = version
+                changed = True
+        if changed:
+            _global_version += 1
+        return _global_version
+
+
+def bump_data_version(*tables: str) -> int:
+    """Record a committed write to the given tables and return the new global version."""
+    with engine.begin() as conn:
+        for table in tables:
+            updated = conn.execute(
+                update(DataVersion).where(DataVersion.name == table).values(version=DataVersion.version + 1)
+            )
+            if updated.rowcount == 0:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(DataVersion).values(name=table, version=1))
+                except IntegrityError:
+                    # Another worker created the row first
+                    conn.execute(
+                        update(DataVersion).where(DataVersion.name == table).values(version=DataVersion.version + 1)
+                    )
+        rows = conn.execute(
+            select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(tables))
+        ).all()
+    return _merge(rows)
+
+
+async def bump_data_version_async(*tables: str) -> int:
+    """bump_data_version for async endpoints, run off the event loop."""
+    return await run_in_threadpool(bump_data_version, *tables)
+
+
+def _stale() -> bool:
+    return time.monotonic() - _synced_at >= DATA_VERSION_SYNC_SECONDS
+
+
+def _refresh():
+    global _synced_at
+    _synced_at = time.monotonic()
+    with engine.connect() as conn:
+        rows = conn.execute(select(DataVersion.name, DataVersion.version)).all()
+    _merge(rows)
+
+
+def _sync():
+    # Blocking: only for code already running in the threadpool (sync
+    # endpoints and dependencies). Async code awaits sync_data_versions.
+    if _stale():
+        _refresh()
+
+
+async def sync_data_versions():
+    """
+    Dependency for async endpoints: re-read other workers' writes off the
+    event loop, so a slow or locked database never stalls it.
+    """
+    if _stale():
+        await run_in_threadpool(_refresh)
+
+
+def data_version() -> int:
+    """A version that changes whenever any table does."""
+    _sync()
+    return _global_version
+
+
+def cached_data_version() -> int:
+    """data_version as last synced, without touching the database."""
+    return _global_version
+
+
+def current_table_versions() -> Dict[str, int]:
+    """Every table's version as this worker currently knows it."""
+    _sync()
+    with _lock:
+        return dict(_table_versions)
+
+
+def table_versions(*tables: str) -> Tuple[int, ...]:
+    _sync()
+    return tuple(_table_versions.get(table, 0) for table in tables)
@@ -4,6 +4,8 @@ from auth import get_current_user
 from models import Department, Employee
 from schemas import DepartmentCreate, DepartmentResponse
 from database import get_db
+from dataVersion import bump_data_version
+from conditionalGet import conditional_get
 
 router = APIRouter()
 
@@ -22,12 +24,13 @@ def create_department(department: DepartmentCreate, db: Session = Depends(get_db
     new_department = Department(department_code = department.department_code,name=department.name)
     db.add(new_department)
     db.commit()
+    bump_data_version("departments")
     db.refresh(new_department)
 
     return new_department
 
 
-@router.get("/departments/", response_model=list[DepartmentResponse])
+@router.get("/departments/", response_model=list[DepartmentResponse], dependencies=[conditional_get("departments")])
 def get_departments(db: Session = Depends(get_db),
     current_user : dict = Depends(get_current_user)):
 
@@ -59,6 +62,7 @@ def update_department(department_code: str, department_data: DepartmentCreate, d
     department.department_code = department_data.department_code
     department.name = department_data.name
     db.commit()
+    bump_data_version("departments")
     db.refresh(department)
 
     return department
@@ -82,5 +86,6 @@ def delete_department(department_code: str, db: Session = Depends(get_db),
         )
     db.delete(department)
     db.commit()
+    bump_data_version("departments")
 
     return {"message": "Department deleted successfully"}
@@ -1,18 +1,23 @@
 from datetime import date
 from operator import and_
-from fastapi import APIRouter, Depends, File, UploadFile
+from fastapi import APIRouter, Depends, File, Response, UploadFile
 from models import Competency, Department, Employee, EmployeeCompetency, ManagingEmployee, Role, RoleCompetency
 from fastapi.responses import JSONResponse
-import pandas as pd
 import re
 import json
 from io import BytesIO
-from typing import List
+from typing import List, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from models import Employee, EmployeeCompetency, RoleCompetency
-from database import get_db
+from database import get_async_db
+from dataVersion import bump_data_version_async
 from auth import get_current_user
 from schemas import BulkEvaluationStatusUpdate, EmployeeCreateRequest, EmployeeEvaluationStatusUpdate, EmployeeResponse, ManagerResponse
+from statsRollup import RollupDelta, employee_competency_rows, remove_employee_rows
+from pagination import KeysetParams, filter_employees, keyset_paginate, page_headers
+from conditionalGet import conditional_get
 
 
 
@@ -24,16 +29,16 @@ from fastapi import HTTPException, status
 
 
 @router.get("/employee/{employee_number}", response_model=dict)
-def get_employee_details(
+async def get_employee_details(
     employee_number: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):      
     role =current_user["role"] 
     if role not in ["HR","ADMIN","EMPLOYEE","HOD"]:
         raise HTTPException(status_code=401, detail="No access")  
     # Use JOIN to fetch employee with department and role names in a single query
-    employee_data = db.query(
+    employee_data = (await db.execute(select(
         Employee,
         Department.name.label("department_name"),
         Role.name.label("role_name")
@@ -41,13 +46,15 @@ def get_employee_details(
         Department, Employee.department_code == Department.department_code
     ).join(
         Role, Employee.role_code == Role.role_code
-    ).filter(
+    ).where(
         Employee.employee_number == employee_number
-    ).first()
+    ))).first()
     
     if not employee_data:
         # If the employee exists but has no related department or role, try fetching just the employee
-        employee = db.query(Employee).filter(Employee.employee_number == employee_number).first()
+        employee = (await db.execute(
+            select(Employee).where(Employee.employee_number == employee_number)
+        )).scalars().first()
         if not employee:
             raise HTTPException(status_code=404, detail="Employee not found")
         
@@ -79,18 +86,18 @@ def get_employee_details(
 
 
 @router.post("/employees", response_model=EmployeeResponse)
-def create_employee(
+async def create_employee(
     employee_data: EmployeeCreateRequest, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     # Check if employee already exists
     role =current_user["role"] 
     if role not in [ "HR","ADMIN"]:
         raise HTTPException(status_code=401, detail="No access")  
-    existing_employee = db.query(Employee).filter(
+    existing_employee = (await db.execute(select(Employee).where(
         Employee.employee_number == employee_data.employee_number
-    ).first()
+    ))).scalars().first()
     
     if existing_employee:
         raise HTTPException(
@@ -102,14 +109,15 @@ def create_employee(
         # Create employee
         db_employee = Employee(**employee_data.dict())
         db.add(db_employee)
-        db.flush()  # Ensure we get the employee_number
+        await db.flush()  # Ensure we get the employee_number
         
         # Get competencies for the role
-        role_competencies = db.query(RoleCompetency).filter(
+        role_competencies = (await db.execute(select(RoleCompetency).where(
             RoleCompetency.role_code == employee_data.role_code
-        ).all()
+        ))).scalars().all()
         
         # Create employee competencies
+        rollup = RollupDelta()
         for rc in role_competencies:
             db_competency = EmployeeCompetency(
                 employee_number=db_employee.employee_number,
@@ -118,13 +126,16 @@ def create_employee(
                 actual_score=0 # Changed to None as per your original requirement
             )
             db.add(db_competency)
+            rollup.add(rc.competency_code, db_employee.department_code, rc.required_score, 0)
         
-        db.commit()
-        db.refresh(db_employee)
+        await db.run_sync(rollup.apply)
+        await db.commit()
+        await bump_data_version_async("employees", "employee_competencies")
+        await db.refresh(db_employee)
         return db_employee
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating employee: {str(e)}"
@@ -135,10 +146,10 @@ def create_employee(
 
 
 @router.put("/employees/{employee_number}", response_model=EmployeeResponse)
-def update_employee(
+async def update_employee(
     employee_number: str,
     employee_data: EmployeeCreateRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):  
     role =current_user["role"] 
@@ -146,9 +157,9 @@ def update_employee(
         raise HTTPException(status_code=401, detail="No access")  
     try:
         # Check if employee exists
-        db_employee = db.query(Employee).filter(
+        db_employee = (await db.execute(select(Employee).where(
             Employee.employee_number == employee_number
-        ).first()
+        ))).scalars().first()
         
         if not db_employee:
             raise HTTPException(
@@ -158,9 +169,9 @@ def update_employee(
         
         # Check if new employee_number already exists (if it's being changed)
         if employee_number != employee_data.employee_number:
-            existing_employee = db.query(Employee).filter(
+            existing_employee = (await db.execute(select(Employee).where(
                 Employee.employee_number == employee_data.employee_number
-            ).first()
+            ))).scalars().first()
             
             if existing_employee:
                 raise HTTPException(
@@ -168,19 +179,23 @@ def update_employee(
                     detail=f"Employee with number {employee_data.employee_number} already exists"
                 )
         
+        # Take the old rows out of the stats rollup before they are deleted
+        rollup = RollupDelta()
+        remove_employee_rows(rollup, db_employee.department_code, await db.run_sync(employee_competency_rows, employee_number))
+        
         # First delete all existing employee competencies
-        db.query(EmployeeCompetency).filter(
+        await db.execute(delete(EmployeeCompetency).where(
             EmployeeCompetency.employee_number == employee_number
-        ).delete()
+        ))
         
         # Update employee data
         for field, value in employee_data.dict().items():
             setattr(db_employee, field, value)
         
         # Get competencies for the new role
-        role_competencies = db.query(RoleCompetency).filter(
+        role_competencies = (await db.execute(select(RoleCompetency).where(
             RoleCompetency.role_code == employee_data.role_code
-        ).all()
+        ))).scalars().all()
         
         # Create new employee competencies
         for rc in role_competencies:
@@ -191,13 +206,16 @@ def update_employee(
                 actual_score=0
             )
             db.add(db_competency)
+            rollup.add(rc.competency_code, employee_data.department_code, rc.required_score, 0)
         
-        db.commit()
-        db.refresh(db_employee)
+        await db.run_sync(rollup.apply)
+        await db.commit()
+        await bump_data_version_async("employees", "employee_competencies")
+        await db.refresh(db_employee)
         return db_employee
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating employee: {str(e)}"
@@ -207,9 +225,9 @@ def update_employee(
 
 
 @router.delete("/employees/{employee_number}")
-def delete_employee(
+async def delete_employee(
     employee_number: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):  
     role =current_user["role"] 
@@ -217,9 +235,9 @@ def delete_employee(
         raise HTTPException(status_code=401, detail="No access")  
     try:
 
-        db_employee = db.query(Employee).filter(
+        db_employee = (await db.execute(select(Employee).where(
             Employee.employee_number == employee_number
-        ).first()
+        ))).scalars().first()
         
         if not db_employee:
             raise HTTPException(
@@ -227,19 +245,24 @@ def delete_employee(
                 detail=f"Employee with number {employee_number} not found"
             )
         
+        rollup = RollupDelta()
+        remove_employee_rows(rollup, db_employee.department_code, await db.run_sync(employee_competency_rows, employee_number))
+        
         # First delete all employee competencies
-        db.query(EmployeeCompetency).filter(
+        await db.execute(delete(EmployeeCompetency).where(
             EmployeeCompetency.employee_number == employee_number
-        ).delete()
+        ))
         
         # Then delete the employee
-        db.delete(db_employee)
-        db.commit()
+        await db.delete(db_employee)
+        await db.run_sync(rollup.apply)
+        await db.commit()
+        await bump_data_version_async("employees", "employee_competencies")
         
         return {"message": f"Employee {employee_number} deleted successfully"}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting employee: {str(e)}"
@@ -247,27 +270,33 @@ def delete_employee(
 
 
 
-@router.get("/employees", response_model=List[EmployeeResponse])
-def get_all_employees(
-    db: Session = Depends(get_db),
+@router.get("/employees", response_model=List[EmployeeResponse], dependencies=[conditional_get("employees")])
+async def get_all_employees(
+    response: Response,
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    evaluation_status: Optional[bool] = None,
+    page: KeysetParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
     role =current_user["role"] 
     if role not in ["HOD", "HR","ADMIN"]:
         raise HTTPException(status_code=401, detail="No access")  
     try:
-        if role in ["HR","ADMIN"]:
+        def page_of_employees(session: Session):
+            query = filter_employees(session.query(Employee), department_code, role_code, evaluation_status)
+            if role not in ["HR","ADMIN"]:
+                # HODs only see their own department
+                query = query.filter(Employee.department_code == current_user["department_code"])
+            return keyset_paginate(query, Employee.employee_number, page)
 
-            employees = db.query(Employee).all()
-            return employees
-        
-        else:
-            employees = db.query(Employee).filter(and_(
-            Employee.department_code == current_user["department_code"]
-        )).all()
-            
-            return employees
+        employees, next_cursor = await db.run_sync(page_of_employees)
+        response.headers.update(page_headers(next_cursor))
+        return employees
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -279,9 +308,9 @@ def get_all_employees(
 
 
 @router.get("/managing-employee/{empnumber}",response_model=ManagerResponse)
-def getManagingEmployee(empnumber:str,db: Session = Depends(get_db),
+async def getManagingEmployee(empnumber:str,db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
-    res = db.query(ManagingEmployee).filter(ManagingEmployee.employee_number==empnumber).first()
+    res = (await db.execute(select(ManagingEmployee).where(ManagingEmployee.employee_number==empnumber))).scalars().first()
 
     return res
\ No newline at end of file
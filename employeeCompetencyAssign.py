@@ -1,9 +1,11 @@
 from typing import List
 from auth import get_current_user
 from database import get_db
+from dataVersion import bump_data_version
 from fastapi import APIRouter, Depends, HTTPException, status
 from models import Competency, Employee, EmployeeCompetency
 from sqlalchemy.orm import Session
+from statsRollup import RollupDelta
 
 router = APIRouter()
 
@@ -43,16 +45,19 @@ def add_competencies_to_employee(
                 detail=f"Competencies not found: {', '.join(missing_codes)}"
             )
         
+        # Competencies the employee already has, in one query
+        existing_codes = {
+            code for code, in db.query(EmployeeCompetency.competency_code).filter(
+                EmployeeCompetency.employee_number == employee_number,
+                EmployeeCompetency.competency_code.in_(competency_codes)
+            )
+        }
+        
         # Create employee competencies
         added = []
+        rollup = RollupDelta()
         for competency in competencies:
-            # Check if relationship already exists
-            existing = db.query(EmployeeCompetency).filter(
-                EmployeeCompetency.employee_number == employee_number,
-                EmployeeCompetency.competency_code == competency.code
-            ).first()
-            
-            if not existing:
+            if competency.code not in existing_codes:
                 emp_comp = EmployeeCompetency(
                     employee_number=employee_number,
                     competency_code=competency.code,
@@ -61,8 +66,11 @@ def add_competencies_to_employee(
                 )
                 db.add(emp_comp)
                 added.append(competency.code)
+                rollup.add(competency.code, employee.department_code, competency.required_score, 0)
         
+        rollup.apply(db)
         db.commit()
+        bump_data_version("employee_competencies")
         return {"message": f"Successfully added competencies: {', '.join(added)}"}
 
     except HTTPException:
@@ -102,13 +110,20 @@ def remove_competencies_from_employee(
                 detail="Not authorized to modify this employee's competencies"
             )
         
-        # Delete the employee competencies
-        deleted_count = db.query(EmployeeCompetency).filter(
+        removed = db.query(EmployeeCompetency).filter(
             EmployeeCompetency.employee_number == employee_number,
             EmployeeCompetency.competency_code.in_(competency_codes)
-        ).delete(synchronize_session=False)
+        )
+        rollup = RollupDelta()
+        for row in removed:
+            rollup.remove(row.competency_code, employee.department_code, row.required_score, row.actual_score)
+        
+        # Delete the employee competencies
+        deleted_count = removed.delete(synchronize_session=False)
         
+        rollup.apply(db)
         db.commit()
+        bump_data_version("employee_competencies")
         
         if deleted_count == 0:
             return {"message": "No matching competencies found to remove"}
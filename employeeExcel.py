@@ -2,7 +2,6 @@ from datetime import date
 from fastapi import APIRouter, Depends, File, UploadFile
 from models import Competency, Department, Employee, EmployeeCompetency, Role, RoleCompetency
 from fastapi.responses import JSONResponse
-import pandas as pd
 import re
 import json
 from io import BytesIO
@@ -10,8 +9,14 @@ from typing import List
 from sqlalchemy.orm import Session
 from models import Employee, EmployeeCompetency, RoleCompetency
 from database import get_db
+from dataVersion import bump_data_version_async
 from auth import get_current_user
 from schemas import BulkEvaluationStatusUpdate, EmployeeCreateRequest, EmployeeEvaluationStatusUpdate, EmployeeResponse
+from excelParser import iter_excel_employees, parse_excel_employees
+from employeeImport import dry_run_employees, import_employees, import_report, upsert_employees, upsert_report
+from importJobs import create_import_job, submit_import_job
+from uploads import detach_upload
+from starlette.concurrency import run_in_threadpool
 
 
 
@@ -123,129 +128,8 @@ from fastapi import HTTPException, status
     
 #     return employees
 def process_excel_content(excel_content: bytes) -> List[dict]:
-    xls = pd.ExcelFile(BytesIO(excel_content))
-    csv_content = []
-    
-    for sheet_name in xls.sheet_names:
-        csv_content.append(f"--- Sheet: {sheet_name} ---,\n")
-        df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
-        
-        for row in df.values:
-            clean_row = [str(cell).strip().replace(',', '/') if pd.notna(cell) else "" for cell in row]
-            
-            cleaned = []
-            prev_empty = False
-            for cell in clean_row:
-                if cell == "":
-                    if not prev_empty:
-                        cleaned.append(cell)
-                    prev_empty = True
-                else:
-                    cleaned.append(cell)
-                    prev_empty = False
-            
-            csv_line = ",".join([cell for cell in cleaned if cell != ""]) + ","
-            csv_line = re.sub(r',,+', ',', csv_line)
-            
-            if csv_line.strip(','):
-                csv_content.append(csv_line + "\n")
-        
-        csv_content.append(",\n")
-    
-    employees = []
-    current_employee = None
-    current_sheet = ""
-    words = []
-    in_competencies = False
-    rpl_apl_count = 0
-    
-    for line in csv_content:
-        line = line.strip()
-        if not line:
-            continue
-        
-        raw_parts = line.split(',')
-        line_words = []
-        
-        for part in raw_parts:
-            stripped_word = part.strip()
-            if stripped_word:
-                line_words.append(stripped_word)
-        
-        words.extend(line_words)
-
-    i = 0
-    while i < len(words):
-        word = words[i]
-        
-        if word.startswith('--- Sheet:'):
-            if current_employee is not None:
-                employees.append(current_employee)
-            current_employee = {
-                "EmployeeNumber": "",
-                "EmployeeName": "",
-                "JobCode": "",
-                "ReportingEmployeeName": "",
-                "RoleCode": "",
-                "Department": "",
-                "Competencies": []
-            }
-            in_competencies = False
-            rpl_apl_count = 0
-            current_sheet = word.replace('--- Sheet:', '').replace('---', '').strip()
-            i += 1
-            continue
-        
-        if not in_competencies:
-            if word == "Employee Number" and i+1 < len(words):
-                current_employee["EmployeeNumber"] = words[i+1]
-                i += 2
-            elif word == "Employee Name" and i+1 < len(words):
-                current_employee["EmployeeName"] = words[i+1]
-                i += 2
-            elif word == "Job Code" and i+1 < len(words):
-                current_employee["JobCode"] = words[i+1]
-                i += 2
-            elif word == "Reporting Employee Name" and i+1 < len(words):
-                current_employee["ReportingEmployeeName"] = words[i+1]
-                i += 2
-            elif word == "Role Code" and i+1 < len(words):
-                current_employee["RoleCode"] = words[i+1]
-                i += 2
-            elif word == "Department & Cost Centre" and i+1 < len(words):
-                current_employee["Department"] = words[i+1]
-                i += 2
-            elif word == "RPL/APL":
-                rpl_apl_count += 1
-                if rpl_apl_count == 2:  # Second occurrence starts competencies
-                    in_competencies = True
-                i += 1
-            else:
-                i += 1
-        else:
-            # Competency parsing logic
-            if i + 2 < len(words):
-                # Skip headers
-                if words[i] in ["Functional competencies", "Behavioral competencies"]:
-                    i += 1
-                    continue
-                
-                # Get score part before slash and convert to integer
-                raw_score = words[i+2]
-                score = int(raw_score.split('/')[0]) if raw_score else 0
-                
-                current_employee["Competencies"].append({
-                    "Code": words[i+1],
-                    "Score": score
-                })
-                i += 3
-            else:
-                i += 1
-    
-    if current_employee is not None:
-        employees.append(current_employee)
-    
-    return employees
+    """Employee records of every sheet of an uploaded workbook, in sheet order."""
+    return list(iter_excel_employees(BytesIO(excel_content)))
 
 
 # @router.post("/employees/upload-excel")
@@ -335,98 +219,55 @@ def process_excel_content(excel_content: bytes) -> List[dict]:
 @router.post("/employees/upload-excel")
 async def upload_excel_employees(
     file: UploadFile = File(...),
+    background: bool = False,
+    dry_run: bool = False,
+    mode: str = "create",
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):  
     role =current_user["role"] 
     if role not in ["HR","ADMIN"]:
         raise HTTPException(status_code=401, detail="No access")  
+    if mode not in ["create", "upsert"]:
+        raise HTTPException(status_code=400, detail="mode must be create or upsert")
+    if mode == "upsert" and background and not dry_run:
+        raise HTTPException(status_code=400, detail="Upserts can't run in the background")
+
+    # Starlette spools uploads to a temporary file, the parsers read it in place
     try:
-        excel_content = await file.read()
-        employee_data = process_excel_content(excel_content)
-        
-        results = []
-        
-        for emp in employee_data:
-            try:
-                # Check if employee exists
-                if db.query(Employee).filter_by(employee_number=emp["EmployeeNumber"]).first():
-                    results.append({
-                        "employee_number": emp["EmployeeNumber"],
-                        "status": "error",
-                        "message": "Employee already exists"
-                    })
-                    continue
-                
-                # Verify department exists
-                department = db.query(Department).filter(
-                    (
-                        Department.department_code == emp["Department"]
-                    )
-                ).first()
-                
-                if not department:
-                    results.append({
-                        "employee_number": emp["EmployeeNumber"],
-                        "status": "error",
-                        "message": f"Department '{emp['Department']}' not found"
-                    })
-                    continue
-                
-                # Create new employee
-                new_employee = Employee(
-                    employee_number=emp["EmployeeNumber"],
-                    employee_name=emp["EmployeeName"],
-                    job_code=emp["JobCode"],
-                    reporting_employee_name=emp["ReportingEmployeeName"],
-                    role_code=emp["RoleCode"],
-                    department_code=department.department_code,
-                    evaluation_status=False,
-                    evaluation_by=None,
-                    last_evaluated_date=None
-                )
-                db.add(new_employee)
-                db.flush()
-                
-                if "Competencies" in emp:
-                    for comp in emp["Competencies"]:
-                        competency = db.query(Competency).filter_by(
-                            code=comp["Code"]
-                        ).first()
-                        
-                        if competency:
-                            score = int(comp["Score"])
-                            db.add(EmployeeCompetency(
-                                employee_number=new_employee.employee_number,
-                                competency_code=comp["Code"],
-                                required_score=score,  
-                                actual_score=0  
-                            ))
-                        else:
-                            print(f"Competency {comp['Code']} not found for employee {emp['EmployeeNumber']}")
-                
-                db.commit()
-                
-                results.append({
-                    "employee_number": emp["EmployeeNumber"],
-                    "status": "success",
-                    "message": "Employee created successfully"
-                })
-                
-            except Exception as e:
-                db.rollback()
-                results.append({
-                    "employee_number": emp.get("EmployeeNumber", "UNKNOWN"),
-                    "status": "error",
-                    "message": str(e)
-                })
+        # Validate only, the report says what an import would do
+        if dry_run:
+            employee_data = await parse_excel_employees(file.file)
+            if mode == "upsert":
+                results, changes = await run_in_threadpool(upsert_employees, db, employee_data, dry_run=True)
+                return JSONResponse(content={**upsert_report(results, changes), "dry_run": True})
+            results = await run_in_threadpool(dry_run_employees, db, employee_data)
+            return JSONResponse(content={**import_report(results), "dry_run": True})
+
+        # Large files: return a job id now, progress is at GET /imports/{job_id}
+        if background:
+            job = await run_in_threadpool(create_import_job, db, file.filename, current_user["username"])
+            # The job outlives the request and closes its handle when done
+            submit_import_job(job.id, await run_in_threadpool(detach_upload, file))
+            return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+        # Parsed in a thread, or across the process pool for large workbooks
+        employee_data = await parse_excel_employees(file.file)
+
+        # Re-uploads: update existing employees in place, answer with a diff
+        if mode == "upsert":
+            results, changes = await run_in_threadpool(upsert_employees, db, employee_data)
+            if changes:
+                await bump_data_version_async("employees", "employee_competencies")
+            return JSONResponse(content=upsert_report(results, changes))
+
+        # Validation and bulk inserts are blocking, keep them off the event loop
+        results = await run_in_threadpool(import_employees, db, employee_data)
         
-        return JSONResponse(content={
-            "results": results,
-            "total_processed": len(employee_data),
-            "success_count": len([r for r in results if r["status"] == "success"]),
-            "error_count": len([r for r in results if r["status"] == "error"])
-        })
+        if any(r["status"] == "success" for r in results):
+            await bump_data_version_async("employees", "employee_competencies")
+
+        return JSONResponse(content=import_report(results))
     
     except Exception as e:
         raise HTTPException(
@@ -0,0 +1,410 @@
+import os
+from typing import Callable, Iterable, List, Optional
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from models import Competency, Department, Employee, EmployeeCompetency, Role
+from statsRollup import RollupDelta
+
+# Employees written per transaction by the bulk import
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+
+# Employee columns an upsert compares with the workbook and updates
+UPSERT_COLUMNS = ["employee_name", "job_code", "reporting_employee_name", "role_code", "department_code"]
+
+
+class ImportLookups:
+    """Everything the import validates against, fetched once per import."""
+
+    def __init__(self, db: Session):
+        self.employees = {number for number, in db.query(Employee.employee_number)}
+        self.departments = {code for code, in db.query(Department.department_code)}
+        self.roles = {code for code, in db.query(Role.role_code)}
+        self.competencies = {code for code, in db.query(Competency.code)}
+
+
+def import_result(employee_number, status: str, message: str) -> dict:
+    return {"employee_number": employee_number, "status": status, "message": message}
+
+
+def import_report(results: List[dict]) -> dict:
+    """The response body of an Excel import."""
+    return {
+        "results": results,
+        "total_processed": len(results),
+        "success_count": len([r for r in results if r["status"] == "success"]),
+        "error_count": len([r for r in results if r["status"] == "error"])
+    }
+
+
+def validate_employee(emp: dict, lookups: ImportLookups) -> Optional[str]:
+    """The error message for a parsed employee, or None when it can be created."""
+    if emp["EmployeeNumber"] in lookups.employees:
+        return "Employee already exists"
+    return validate_record(emp, lookups)
+
+
+def validate_record(emp: dict, lookups: ImportLookups) -> Optional[str]:
+    """Checks shared by creating and upserting: the department and competency list."""
+    if emp["Department"] not in lookups.departments:
+        return f"Department '{emp['Department']}' not found"
+
+    seen = set()
+    for comp in emp.get("Competencies", []):
+        if comp["Code"] in seen:
+            return f"Competency '{comp['Code']}' is listed more than once"
+        seen.add(comp["Code"])
+    return None
+
+
+def employee_rows(emp: dict, lookups: ImportLookups):
+    """The employees row and employee_competencies rows for a validated employee."""
+    employee = {
+        "employee_number": emp["EmployeeNumber"],
+        "employee_name": emp["EmployeeName"],
+        "job_code": emp["JobCode"],
+        "reporting_employee_name": emp["ReportingEmployeeName"],
+        "role_code": emp["RoleCode"],
+        "department_code": emp["Department"],
+        "evaluation_status": False,
+        "evaluation_by": None,
+        "last_evaluated_date": None,
+    }
+    competencies = []
+    for comp in emp.get("Competencies", []):
+        if comp["Code"] in lookups.competencies:
+            competencies.append({
+                "employee_number": emp["EmployeeNumber"],
+                "competency_code": comp["Code"],
+                "required_score": int(comp["Score"]),
+                "actual_score": 0,
+            })
+        else:
+            print(f"Competency {comp['Code']} not found for employee {emp['EmployeeNumber']}")
+    return employee, competencies
+
+
+def dry_run_employees(db: Session, employees: Iterable[dict]) -> List[dict]:
+    """
+    The results import_employees would return, without writing anything.
+    Records that would be created note what the import would skip or leave
+    dangling: competency codes that don't exist and an unknown role.
+    """
+    lookups = ImportLookups(db)
+    results = []
+    for emp in employees:
+        error = validate_employee(emp, lookups)
+        if error:
+            results.append(import_result(emp.get("EmployeeNumber", "UNKNOWN"), "error", error))
+            continue
+
+        lookups.employees.add(emp["EmployeeNumber"])
+        notes = []
+        if emp["RoleCode"] not in lookups.roles:
+            notes.append(f"role '{emp['RoleCode']}' not found")
+        missing = [c["Code"] for c in emp.get("Competencies", []) if c["Code"] not in lookups.competencies]
+        if missing:
+            notes.append(f"competencies not found, would be skipped: {', '.join(missing)}")
+        results.append(import_result(emp["EmployeeNumber"], "success", "; ".join(["Employee would be created"] + notes)))
+    return results
+
+
+def _insert(db: Session, employees: List[dict], competencies: List[dict]):
+    rollup = RollupDelta()
+    departments = {e["employee_number"]: e["department_code"] for e in employees}
+    for row in competencies:
+        rollup.add(row["competency_code"], departments[row["employee_number"]], row["required_score"], 0)
+
+    db.execute(insert(Employee), employees)
+    if competencies:
+        db.execute(insert(EmployeeCompetency), competencies)
+    rollup.apply(db)
+
+
+def _write_chunk(db: Session, chunk: List[tuple], results: List[dict]):
+    """
+    Insert a chunk of (result index, employee row, competency rows) in one
+    transaction. If the chunk fails, retry its employees one by one so a
+    single bad row only fails itself.
+    """
+    try:
+        _insert(db, [e for _, e, _ in chunk], [c for _, _, rows in chunk for c in rows])
+        db.commit()
+        for index, _, _ in chunk:
+            results[index] = import_result(results[index]["employee_number"], "success", "Employee created successfully")
+        return
+    except SQLAlchemyError:
+        db.rollback()
+
+    for index, employee, competencies in chunk:
+        try:
+            _insert(db, [employee], competencies)
+            db.commit()
+            results[index] = import_result(employee["employee_number"], "success", "Employee created successfully")
+        except SQLAlchemyError as e:
+            db.rollback()
+            results[index] = import_result(employee["employee_number"], "error", str(e))
+
+
+def import_employees(
+    db: Session,
+    employees: Iterable[dict],
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    on_progress: Optional[Callable[[List[dict]], None]] = None
+) -> List[dict]:
+    """
+    Create employees and their competencies from parsed workbook records.
+
+    Lookups are fetched once up front and every record is validated in
+    memory; valid ones are written with executemany inserts, chunk_size
+    employees per transaction. Returns one result per record, in order.
+    on_progress, if given, is called with the results so far whenever
+    another chunk_size of them are final, and once at the end.
+    """
+    lookups = ImportLookups(db)
+    results = []
+    chunk = []
+    reported = 0
+
+    for emp in employees:
+        error = validate_employee(emp, lookups)
+        if error:
+            results.append(import_result(emp.get("EmployeeNumber", "UNKNOWN"), "error", error))
+        else:
+            # Later rows in the same file see this employee as existing
+            lookups.employees.add(emp["EmployeeNumber"])
+            employee, competencies = employee_rows(emp, lookups)
+            results.append(import_result(emp["EmployeeNumber"], "pending", ""))
+            chunk.append((len(results) - 1, employee, competencies))
+            if len(chunk) >= chunk_size:
+                _write_chunk(db, chunk, results)
+                chunk = []
+
+        # Results are final once no chunk is waiting to be written
+        if on_progress and not chunk and len(results) - reported >= chunk_size:
+            on_progress(results)
+            reported = len(results)
+
+    if chunk:
+        _write_chunk(db, chunk, results)
+    if on_progress:
+        on_progress(results)
+    return results
+
+
+class _Upsert:
+    """The writes that bring one employee in line with its workbook record."""
+
+    def __init__(self, index: int, employee_number: str):
+        self.index = index
+        self.employee_number = employee_number
+        self.action = "unchanged"
+        self.insert_employee = None
+        self.update_employee = None
+        self.insert_competencies = []
+        self.update_competencies = []
+        self.delete_competencies = []
+        self.rollup = []  # (sign, competency, department, required, actual)
+        self.diff = {}
+
+
+def _plan_upsert(index: int, emp: dict, lookups: ImportLookups, current, current_competencies: dict) -> _Upsert:
+    """
+    Compare a record with the employee's current row and competencies
+    ({code: (id, required, actual)}). Actual scores of kept competencies
+    are left alone.
+    """
+    plan = _Upsert(index, emp["EmployeeNumber"])
+    employee, competencies = employee_rows(emp, lookups)
+
+    if current is None:
+        plan.action = "created"
+        plan.insert_employee = employee
+        plan.insert_competencies = competencies
+        plan.rollup = [(1, c["competency_code"], employee["department_code"], c["required_score"], 0) for c in competencies]
+        plan.diff = {"competencies_added": [c["competency_code"] for c in competencies]}
+        return plan
+
+    fields = {
+        column: [getattr(current, column), employee[column]]
+        for column in UPSERT_COLUMNS if getattr(current, column) != employee[column]
+    }
+    if fields:
+        plan.update_employee = {"employee_number": plan.employee_number, **{c: new for c, (_, new) in fields.items()}}
+        plan.diff["fields"] = fields
+
+    old_department = current.department_code
+    new_department = employee["department_code"]
+    required = {c["competency_code"]: c["required_score"] for c in competencies}
+    removed, changed = [], {}
+
+    for code, (row_id, old_required, actual) in current_competencies.items():
+        if code not in required:
+            plan.delete_competencies.append(row_id)
+            plan.rollup.append((-1, code, old_department, old_required, actual))
+            removed.append(code)
+            continue
+        if required[code] != old_required:
+            plan.update_competencies.append({"id": row_id, "required_score": required[code]})
+            changed[code] = [old_required, required[code]]
+        if required[code] != old_required or new_department != old_department:
+            plan.rollup.append((-1, code, old_department, old_required, actual))
+            plan.rollup.append((1, code, new_department, required[code], actual))
+
+    added = [c for c in competencies if c["competency_code"] not in current_competencies]
+    plan.insert_competencies = added
+    plan.rollup.extend((1, c["competency_code"], new_department, c["required_score"], 0) for c in added)
+
+    if added:
+        plan.diff["competencies_added"] = [c["competency_code"] for c in added]
+    if removed:
+        plan.diff["competencies_removed"] = removed
+    if changed:
+        plan.diff["competencies_changed"] = changed
+    if plan.diff:
+        plan.action = "updated"
+    return plan
+
+
+def _apply_upserts(db: Session, plans: List[_Upsert]):
+    rollup = RollupDelta()
+    for plan in plans:
+        for sign, code, department, required_score, actual_score in plan.rollup:
+            rollup.add(code, department, required_score, actual_score, sign=sign)
+
+    employees = [p.insert_employee for p in plans if p.insert_employee]
+    employee_updates = [p.update_employee for p in plans if p.update_employee]
+    deleted = [row_id for p in plans for row_id in p.delete_competencies]
+    competency_updates = [row for p in plans for row in p.update_competencies]
+    competencies = [row for p in plans for row in p.insert_competencies]
+
+    if employees:
+        db.execute(insert(Employee), employees)
+    if employee_updates:
+        db.execute(update(Employee), employee_updates)
+    if deleted:
+        db.execute(delete(EmployeeCompetency).where(EmployeeCompetency.id.in_(deleted)))
+    if competency_updates:
+        db.execute(update(EmployeeCompetency), competency_updates)
+    if competencies:
+        db.execute(insert(EmployeeCompetency), competencies)
+    rollup.apply(db)
+
+
+def _upsert_message(plan: _Upsert) -> str:
+    return {
+        "created": "Employee created successfully",
+        "updated": "Employee updated",
+        "unchanged": "Employee unchanged",
+    }[plan.action]
+
+
+def _write_upserts(db: Session, plans: List[_Upsert], results: List[dict], changes: List[dict], dry_run: bool):
+    """Like _write_chunk: one transaction for the chunk, one per employee if that fails."""
+    writes = [p for p in plans if p.action != "unchanged"]
+    failed = {}
+    if writes and not dry_run:
+        try:
+            _apply_upserts(db, writes)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            for plan in writes:
+                try:
+                    _apply_upserts(db, [plan])
+                    db.commit()
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    failed[plan.index] = str(e)
+
+    for plan in plans:
+        if plan.index in failed:
+            results[plan.index] = import_result(plan.employee_number, "error", failed[plan.index])
+            continue
+        results[plan.index] = import_result(plan.employee_number, "success", _upsert_message(plan))
+        if plan.action != "unchanged":
+            changes.append({"employee_number": plan.employee_number, "action": plan.action, **plan.diff})
+
+
+def _upsert_chunk(db: Session, chunk: List[tuple], lookups: ImportLookups, results: List[dict], changes: List[dict], dry_run: bool):
+    numbers = [emp["EmployeeNumber"] for _, emp in chunk]
+
+    # One batched fetch of the chunk's current rows
+    current = {
+        row.employee_number: row for row in db.query(
+            Employee.employee_number, *[getattr(Employee, c) for c in UPSERT_COLUMNS]
+        ).filter(Employee.employee_number.in_(numbers))
+    }
+    current_competencies = {number: {} for number in numbers}
+    for row in db.query(
+        EmployeeCompetency.id,
+        EmployeeCompetency.employee_number,
+        EmployeeCompetency.competency_code,
+        EmployeeCompetency.required_score,
+        EmployeeCompetency.actual_score
+    ).filter(EmployeeCompetency.employee_number.in_(numbers)):
+        current_competencies[row.employee_number][row.competency_code] = (row.id, row.required_score, row.actual_score)
+
+    plans = [
+        _plan_upsert(index, emp, lookups, current.get(emp["EmployeeNumber"]), current_competencies[emp["EmployeeNumber"]])
+        for index, emp in chunk
+    ]
+    _write_upserts(db, plans, results, changes, dry_run)
+
+
+def upsert_employees(db: Session, employees: Iterable[dict], chunk_size: int = IMPORT_CHUNK_SIZE, dry_run: bool = False):
+    """
+    Create new employees and bring existing ones in line with their
+    workbook records: changed columns are updated, competencies missing
+    from the workbook are removed and new ones added. Unchanged employees
+    cost no writes. With dry_run nothing is written.
+
+    Returns one result per record, in order, and the changes made.
+    """
+    lookups = ImportLookups(db)
+    results = []
+    changes = []
+    chunk = []
+    seen = set()
+
+    for emp in employees:
+        number = emp.get("EmployeeNumber", "UNKNOWN")
+        error = validate_record(emp, lookups)
+        if error is None and number in seen:
+            error = "Employee is listed more than once in the file"
+        if error:
+            results.append(import_result(number, "error", error))
+            continue
+
+        seen.add(number)
+        results.append(import_result(number, "pending", ""))
+        chunk.append((len(results) - 1, emp))
+        if len(chunk) >= chunk_size:
+            _upsert_chunk(db, chunk, lookups, results, changes, dry_run)
+            chunk = []
+
+    if chunk:
+        _upsert_chunk(db, chunk, lookups, results, changes, dry_run)
+    return results, changes
+
+
+def upsert_report(results: List[dict], changes: List[dict]) -> dict:
+    """The response body of an upsert import: counts, what changed and the errors."""
+    def count(key):
+        return sum(len(c.get(key, [])) for c in changes)
+
+    created = len([c for c in changes if c["action"] == "created"])
+    updated = len(changes) - created
+    errors = [r for r in results if r["status"] == "error"]
+    return {
+        "total_processed": len(results),
+        "created": created,
+        "updated": updated,
+        "unchanged": len(results) - len(errors) - created - updated,
+        "error_count": len(errors),
+        "competencies_added": count("competencies_added"),
+        "competencies_removed": count("competencies_removed"),
+        "competencies_changed": count("competencies_changed"),
+        "changes": changes,
+        "errors": errors
+    }
@@ -3,6 +3,7 @@ from http.client import HTTPException
 from typing import List
 from auth import get_current_user
 from database import get_db
+from dataVersion import bump_data_version_async
 from fastapi import APIRouter, Depends
 from models import Employee
 from schemas import BulkEvaluationStatusUpdate, EmployeeEvaluationStatusUpdate, EmployeeResponse
@@ -33,4 +34,5 @@ async def bulk_update_evaluation_status(
         employee.evaluation_status = update_data.status
     
     db.commit()
+    await bump_data_version_async("employees")
     return employees
\ No newline at end of file
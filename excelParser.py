@@ -0,0 +1,237 @@
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import IO, Iterator, List, Optional, Union
+from uploads import upload_path
+
+# Processes used to parse large workbooks, 0 or 1 parses in the calling thread
+EXCEL_PARSE_WORKERS = int(os.getenv("EXCEL_PARSE_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+# Workbooks with fewer sheets aren't worth shipping to the process pool
+EXCEL_PARALLEL_MIN_SHEETS = int(os.getenv("EXCEL_PARALLEL_MIN_SHEETS", "200"))
+
+# Strings pandas.read_excel treats as missing by default, so the old
+# DataFrame based parser dropped these cells
+PANDAS_NA_STRINGS = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+])
+
+# Labels whose next word is the value, and the record field they fill
+EMPLOYEE_FIELDS = {
+    "Employee Number": "EmployeeNumber",
+    "Employee Name": "EmployeeName",
+    "Job Code": "JobCode",
+    "Reporting Employee Name": "ReportingEmployeeName",
+    "Role Code": "RoleCode",
+    "Department & Cost Centre": "Department",
+}
+
+COMPETENCY_HEADERS = ("Functional competencies", "Behavioral competencies")
+
+# Error values, e.g. #DIV/0!, which pandas read as missing too
+ERROR_CODES = frozenset(["#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"])
+
+
+def cell_text(value) -> str:
+    """
+    A cell value as the pandas based parser rendered it: "" for empty, error
+    and NA cells, integral numbers without a decimal part, commas as slashes.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        if value in PANDAS_NA_STRINGS or value in ERROR_CODES:
+            return ""
+    elif isinstance(value, float):
+        if math.isnan(value):
+            return ""
+        if value.is_integer():
+            value = int(value)
+    return str(value).strip().replace(",", "/")
+
+
+def sheet_words(worksheet) -> List[str]:
+    """The non-empty cell texts of a sheet in row order."""
+    words = []
+    for row in worksheet.iter_rows(values_only=True):
+        for value in row:
+            text = cell_text(value)
+            if text:
+                words.append(text)
+    return words
+
+
+def parse_employee_words(words: List[str]) -> dict:
+    """
+    Build the employee record of one sheet: the labelled fields come first,
+    competencies follow the second "RPL/APL" header as (name, code, score)
+    triples.
+    """
+    employee = {
+        "EmployeeNumber": "",
+        "EmployeeName": "",
+        "JobCode": "",
+        "ReportingEmployeeName": "",
+        "RoleCode": "",
+        "Department": "",
+        "Competencies": []
+    }
+    in_competencies = False
+    rpl_apl_count = 0
+
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if not in_competencies:
+            if word in EMPLOYEE_FIELDS and i+1 < len(words):
+                employee[EMPLOYEE_FIELDS[word]] = words[i+1]
+                i += 2
+            elif word == "RPL/APL":
+                rpl_apl_count += 1
+                if rpl_apl_count == 2:  # Second occurrence starts competencies
+                    in_competencies = True
+                i += 1
+            else:
+                i += 1
+        else:
+            if i + 2 < len(words):
+                # Skip headers
+                if words[i] in COMPETENCY_HEADERS:
+                    i += 1
+                    continue
+
+                # Get score part before slash and convert to integer
+                raw_score = words[i+2]
+                score = int(raw_score.split('/')[0]) if raw_score else 0
+
+                employee["Competencies"].append({
+                    "Code": words[i+1],
+                    "Score": score
+                })
+                i += 3
+            else:
+                i += 1
+    return employee
+
+
+def _load_workbook(source: Union[str, IO[bytes]]):
+    from openpyxl import load_workbook
+
+    return load_workbook(source, read_only=True, data_only=True, keep_links=False)
+
+
+def _iter_sheet_range(source: Union[str, IO[bytes]], start: int = 0, stop: Optional[int] = None) -> Iterator[dict]:
+    workbook = _load_workbook(source)
+    try:
+        for worksheet in workbook.worksheets[start:stop]:
+            yield parse_employee_words(sheet_words(worksheet))
+    finally:
+        workbook.close()
+
+
+def iter_excel_employees(source: Union[str, IO[bytes]]) -> Iterator[dict]:
+    """
+    Yield one employee record per sheet of a workbook, given a path or a
+    binary file object. Sheets are streamed with openpyxl's read-only
+    worksheets, so only one sheet's cells are in memory at a time.
+    """
+    return _iter_sheet_range(source)
+
+
+def _open_source(source: Union[str, bytes, IO[bytes]]):
+    # Paths and file objects are opened by openpyxl, bytes are wrapped
+    return BytesIO(source) if isinstance(source, bytes) else source
+
+
+def sheet_count(source: Union[str, bytes, IO[bytes]]) -> int:
+    workbook = _load_workbook(_open_source(source))
+    try:
+        return len(workbook.worksheets)
+    finally:
+        workbook.close()
+
+
+def parse_sheet_range(source: Union[str, bytes], start: int, stop: int) -> List[dict]:
+    """
+    Employee records of sheets start to stop-1. Module level so it can be
+    sent to a process pool; each worker opens its own copy of the workbook.
+    """
+    return list(_iter_sheet_range(_open_source(source), start, stop))
+
+
+def sheet_ranges(count: int, parts: int) -> List[tuple]:
+    """Split count sheets into at most parts contiguous (start, stop) ranges."""
+    parts = max(1, min(parts, count))
+    size, extra = divmod(count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_pool(workers: int = EXCEL_PARSE_WORKERS) -> ProcessPoolExecutor:
+    """
+    The shared parsing pool, started on first use. Workers are spawned rather
+    than forked, forking a server with running threads can copy held locks.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def parse_excel_parallel(source: Union[str, bytes], pool: ProcessPoolExecutor, parts: int, count: Optional[int] = None) -> List[dict]:
+    """Parse sheet ranges on pool and merge the records back in sheet order."""
+    if count is None:
+        count = sheet_count(source)
+    futures = [pool.submit(parse_sheet_range, source, start, stop) for start, stop in sheet_ranges(count, parts)]
+    employees = []
+    for future in futures:
+        employees.extend(future.result())
+    return employees
+
+
+def parse_excel(source: Union[str, bytes, IO[bytes]], workers: int = EXCEL_PARSE_WORKERS) -> List[dict]:
+    """
+    Employee records of every sheet, in sheet order. Large workbooks are
+    split into one sheet range per worker and parsed in the process pool,
+    small ones in the calling thread.
+    """
+    # Opening reads every sheet's dimensions, so small workbooks are parsed
+    # from the copy opened to count them
+    workbook = _load_workbook(_open_source(source))
+    try:
+        count = len(workbook.worksheets)
+        if workers <= 1 or count < EXCEL_PARALLEL_MIN_SHEETS:
+            return [parse_employee_words(sheet_words(worksheet)) for worksheet in workbook.worksheets]
+    finally:
+        workbook.close()
+
+    if isinstance(source, (str, bytes)):
+        return parse_excel_parallel(source, get_parse_pool(workers), workers, count)
+    # Workers open the workbook themselves, file objects need a path
+    with upload_path(source) as path:
+        return parse_excel_parallel(path, get_parse_pool(workers), workers, count)
+
+
+async def parse_excel_employees(source: Union[str, bytes, IO[bytes]], workers: int = EXCEL_PARSE_WORKERS) -> List[dict]:
+    """parse_excel without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, parse_excel, source, workers)
@@ -0,0 +1,237 @@
+from typing import Callable, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from auth import get_current_user
+from readReplica import Replica, choose_replica
+from models import Competency, Employee, EmployeeCompetency
+from pagination import filter_employees
+from statsRollup import average_score, competency_totals_query, department_competency_totals_query
+from streaming import aiter_query_rows, iter_query_rows, streaming_response, xlsx_response
+
+
+router = APIRouter()
+
+EXPORT_FORMATS = ("csv", "xlsx")
+
+EMPLOYEE_EXPORT_FIELDS = [
+    "employeeNumber",
+    "employeeName",
+    "jobCode",
+    "reportingEmployeeName",
+    "roleCode",
+    "departmentCode",
+    "evaluationStatus",
+    "evaluationBy",
+    "lastEvaluatedDate",
+]
+
+EMPLOYEE_COMPETENCY_EXPORT_FIELDS = [
+    "employeeNumber",
+    "employeeName",
+    "departmentCode",
+    "roleCode",
+    "competencyCode",
+    "competencyName",
+    "requiredScore",
+    "actualScore",
+    "gap",
+]
+
+COMPETENCY_PERFORMANCE_EXPORT_FIELDS = [
+    "competencyCode",
+    "competencyName",
+    "requiredScore",
+    "employeesEvaluated",
+    "averageScore",
+    "employeesMeetingRequired",
+    "fulfillmentRate",
+    "performanceGap",
+]
+
+DEPARTMENT_PERFORMANCE_EXPORT_FIELDS = ["departmentCode"] + COMPETENCY_PERFORMANCE_EXPORT_FIELDS
+
+
+async def export_response(
+    replica: Optional[Replica],
+    output_format: str,
+    build_query: Callable[[Session], object],
+    to_record: Callable,
+    fieldnames: List[str],
+    filename: str
+):
+    """
+    CSV is streamed as rows arrive; .xlsx is written to a temporary file
+    first, a workbook can't be sent before it is complete. Either way rows
+    come from the database in batches, from the replica this request was
+    routed to if any.
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    if output_format == "csv":
+        rows = aiter_query_rows(build_query, bind=replica.async_engine if replica else None)
+        return streaming_response((to_record(r) async for r in rows), "csv", fieldnames, filename=filename)
+
+    rows = iter_query_rows(build_query, bind=replica.engine if replica else None)
+    return await xlsx_response((to_record(r) for r in rows), fieldnames, filename)
+
+
+def _export_department(current_user: dict, department_code: Optional[str]) -> Optional[str]:
+    role =current_user["role"]
+    if role not in ["HR","ADMIN","HOD"]:
+        raise HTTPException(status_code=401, detail="No access")
+    # HODs only export their own department
+    if role == "HOD":
+        return current_user["department_code"]
+    return department_code
+
+
+def _gap(required_score, actual_score):
+    if required_score is None or actual_score is None:
+        return None
+    return required_score - actual_score
+
+
+@router.get("/exports/employees")
+async def export_employees(
+    output_format: str = Query("csv", alias="format", description="csv or xlsx"),
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    evaluation_status: Optional[bool] = None,
+    replica: Optional[Replica] = Depends(choose_replica),
+    current_user: dict = Depends(get_current_user)
+):
+    department_code = _export_department(current_user, department_code)
+
+    def build_query(session: Session):
+        query = session.query(
+            Employee.employee_number,
+            Employee.employee_name,
+            Employee.job_code,
+            Employee.reporting_employee_name,
+            Employee.role_code,
+            Employee.department_code,
+            Employee.evaluation_status,
+            Employee.evaluation_by,
+            Employee.last_evaluated_date
+        )
+        return filter_employees(query, department_code, role_code, evaluation_status).order_by(Employee.employee_number)
+
+    def to_record(r) -> dict:
+        return {
+            "employeeNumber": r.employee_number,
+            "employeeName": r.employee_name,
+            "jobCode": r.job_code,
+            "reportingEmployeeName": r.reporting_employee_name,
+            "roleCode": r.role_code,
+            "departmentCode": r.department_code,
+            "evaluationStatus": r.evaluation_status,
+            "evaluationBy": r.evaluation_by,
+            "lastEvaluatedDate": r.last_evaluated_date
+        }
+
+    return await export_response(replica, output_format, build_query, to_record, EMPLOYEE_EXPORT_FIELDS, "employees")
+
+
+@router.get("/exports/employee-competencies")
+async def export_employee_competencies(
+    output_format: str = Query("csv", alias="format", description="csv or xlsx"),
+    competency_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    evaluation_status: Optional[bool] = None,
+    replica: Optional[Replica] = Depends(choose_replica),
+    current_user: dict = Depends(get_current_user)
+):
+    department_code = _export_department(current_user, department_code)
+
+    def build_query(session: Session):
+        query = (
+            session.query(
+                Employee.employee_number,
+                Employee.employee_name,
+                Employee.department_code,
+                Employee.role_code,
+                Competency.code.label("competency_code"),
+                Competency.name.label("competency_name"),
+                EmployeeCompetency.required_score,
+                EmployeeCompetency.actual_score
+            )
+            .join(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
+            .join(Competency, Competency.code == EmployeeCompetency.competency_code)
+        )
+        if competency_code is not None:
+            query = query.filter(EmployeeCompetency.competency_code == competency_code)
+        query = filter_employees(query, department_code, role_code, evaluation_status)
+        return query.order_by(EmployeeCompetency.employee_number, EmployeeCompetency.competency_code)
+
+    def to_record(r) -> dict:
+        return {
+            "employeeNumber": r.employee_number,
+            "employeeName": r.employee_name,
+            "departmentCode": r.department_code,
+            "roleCode": r.role_code,
+            "competencyCode": r.competency_code,
+            "competencyName": r.competency_name,
+            "requiredScore": r.required_score,
+            "actualScore": r.actual_score,
+            "gap": _gap(r.required_score, r.actual_score)
+        }
+
+    return await export_response(
+        replica, output_format, build_query, to_record, EMPLOYEE_COMPETENCY_EXPORT_FIELDS, "employee-competencies"
+    )
+
+
+def competency_performance_record(r) -> dict:
+    """One row of totals from statsRollup, with the derived figures of the stats endpoints."""
+    avg_score = average_score(r)
+    return {
+        "competencyCode": r.code,
+        "competencyName": r.name,
+        "requiredScore": r.required_score,
+        "employeesEvaluated": r.total_evaluations,
+        "averageScore": round(avg_score, 2) if avg_score is not None else None,
+        "employeesMeetingRequired": r.meeting_required,
+        "fulfillmentRate": round(r.meeting_required / r.total_evaluations * 100, 2) if r.total_evaluations else 0,
+        "performanceGap": round((avg_score or 0) - r.required_score, 2) if r.required_score is not None else None
+    }
+
+
+@router.get("/exports/stats/competency-performance")
+async def export_competency_performance(
+    output_format: str = Query("csv", alias="format", description="csv or xlsx"),
+    department_code: Optional[str] = None,
+    replica: Optional[Replica] = Depends(choose_replica),
+    current_user: dict = Depends(get_current_user)
+):
+    role =current_user["role"]
+    if role not in ["HR","ADMIN"]:
+        raise HTTPException(status_code=401, detail="No access")
+
+    return await export_response(
+        replica, output_format,
+        lambda session: competency_totals_query(session, department_code),
+        competency_performance_record,
+        COMPETENCY_PERFORMANCE_EXPORT_FIELDS,
+        "competency-performance"
+    )
+
+
+@router.get("/exports/stats/department-performance")
+async def export_department_performance(
+    output_format: str = Query("csv", alias="format", description="csv or xlsx"),
+    replica: Optional[Replica] = Depends(choose_replica),
+    current_user: dict = Depends(get_current_user)
+):
+    role =current_user["role"]
+    if role not in ["HR","ADMIN"]:
+        raise HTTPException(status_code=401, detail="No access")
+
+    return await export_response(
+        replica, output_format,
+        department_competency_totals_query,
+        lambda r: {"departmentCode": r.department_code, **competency_performance_record(r)},
+        DEPARTMENT_PERFORMANCE_EXPORT_FIELDS,
+        "department-performance"
+    )
@@ -0,0 +1,262 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import IO, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from auth import get_current_user
+from database import SessionLocal, get_db
+from dataVersion import bump_data_version
+from employeeImport import import_employees
+from excelParser import parse_excel
+from models import ImportJob, ImportJobResult
+from pagination import KeysetParams, keyset_paginate, page_headers
+
+
+router = APIRouter()
+
+# Import jobs run one at a time per worker process by default
+IMPORT_JOB_WORKERS = int(os.getenv("IMPORT_JOB_WORKERS", "1"))
+
+# Error results included in GET /imports/{job_id}, the rest are paged
+JOB_STATUS_ERRORS = 20
+
+# How often a worker process marks its queued and running jobs as alive
+IMPORT_JOB_HEARTBEAT_SECONDS = float(os.getenv("IMPORT_JOB_HEARTBEAT_SECONDS", "15"))
+
+# Unfinished jobs without a heartbeat for this long lost their worker
+IMPORT_JOB_STALE_SECONDS = float(os.getenv("IMPORT_JOB_STALE_SECONDS", str(4 * IMPORT_JOB_HEARTBEAT_SECONDS)))
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_JOB_WORKERS, thread_name_prefix="import-job")
+
+# Jobs this process has queued or is running, kept alive by the heartbeat
+_active_jobs = set()
+_active_lock = threading.Lock()
+
+
+def create_import_job(db: Session, filename: Optional[str], created_by: Optional[str]) -> ImportJob:
+    job = ImportJob(
+        id=uuid.uuid4().hex,
+        filename=filename,
+        status="queued",
+        created_by=created_by,
+        created_at=datetime.utcnow(),
+        heartbeat_at=datetime.utcnow(),
+        processed=0,
+        success_count=0,
+        error_count=0
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+class _ProgressRecorder:
+    """import_employees on_progress callback saving new results and the job's counts."""
+
+    def __init__(self, db: Session, job: ImportJob):
+        self.db = db
+        self.job = job
+        self.saved = 0
+
+    def __call__(self, results: List[dict]):
+        new = results[self.saved:]
+        if not new:
+            return
+        successes = len([r for r in new if r["status"] == "success"])
+
+        self.db.execute(insert(ImportJobResult), [{"job_id": self.job.id, **r} for r in new])
+        self.job.processed = len(results)
+        self.job.success_count += successes
+        self.job.error_count += len(new) - successes
+        self.db.commit()
+        self.saved = len(results)
+
+        # Imported chunks are visible right away, so are their versions
+        if successes:
+            bump_data_version("employees", "employee_competencies")
+
+
+def _finish_job(db: Session, job_id: str, status: str, error: Optional[str] = None) -> bool:
+    # Only a running job is finished, one failed as abandoned meanwhile stays failed
+    finished = db.query(ImportJob).filter(
+        ImportJob.id == job_id,
+        ImportJob.status == "running"
+    ).update({"status": status, "error": error, "finished_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return bool(finished)
+
+
+def run_import_job(job_id: str, source: IO[bytes]):
+    """
+    Parse and import an uploaded workbook for a queued job, recording
+    progress as it goes. The job owns the file handle and closes it when done.
+    """
+    db = SessionLocal()
+    try:
+        started = db.query(ImportJob).filter(
+            ImportJob.id == job_id,
+            ImportJob.status == "queued"
+        ).update({"status": "running", "started_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        if not started:
+            print(f"Import job {job_id} is no longer queued, skipping it")
+            return
+        job = db.get(ImportJob, job_id)
+
+        try:
+            employees = parse_excel(source)
+            job.total = len(employees)
+            db.commit()
+
+            import_employees(db, employees, on_progress=_ProgressRecorder(db, job))
+            status, error = "completed", None
+        except Exception as e:
+            db.rollback()
+            print(f"Import job {job_id} failed: {e}")
+            status, error = "failed", str(e)
+
+        if not _finish_job(db, job_id, status, error):
+            print(f"Import job {job_id} was marked failed while it ran")
+    finally:
+        db.close()
+        source.close()
+        with _active_lock:
+            _active_jobs.discard(job_id)
+
+
+def beat_import_jobs() -> int:
+    """Refresh the heartbeat of the jobs this process has queued or is running."""
+    with _active_lock:
+        job_ids = list(_active_jobs)
+    if not job_ids:
+        return 0
+    db = SessionLocal()
+    try:
+        beaten = db.query(ImportJob).filter(
+            ImportJob.id.in_(job_ids),
+            ImportJob.status.in_(["queued", "running"])
+        ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        return beaten
+    finally:
+        db.close()
+
+
+def fail_abandoned_jobs() -> int:
+    """
+    Mark unfinished jobs whose heartbeat is older than IMPORT_JOB_STALE_SECONDS
+    as failed: the worker process that owned them is gone, other workers keep
+    theirs beating. Returns the jobs marked.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=IMPORT_JOB_STALE_SECONDS)
+    db = SessionLocal()
+    try:
+        failed = db.query(ImportJob).filter(
+            ImportJob.status.in_(["queued", "running"]),
+            func.coalesce(ImportJob.heartbeat_at, ImportJob.created_at) < stale_before
+        ).update({
+            "status": "failed",
+            "error": "Interrupted: the worker running it stopped",
+            "finished_at": datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+        return failed
+    finally:
+        db.close()
+
+
+def start_import_job_heartbeat() -> threading.Thread:
+    """Fail abandoned jobs now, then beat and check every IMPORT_JOB_HEARTBEAT_SECONDS in a background thread."""
+    def check():
+        beat_import_jobs()
+        failed = fail_abandoned_jobs()
+        if failed:
+            print(f"Marked {failed} abandoned import jobs as failed")
+
+    check()
+
+    def beat_forever():
+        while True:
+            time.sleep(IMPORT_JOB_HEARTBEAT_SECONDS)
+            try:
+                check()
+            except Exception as e:
+                print(f"Import job heartbeat failed: {e}")
+
+    thread = threading.Thread(target=beat_forever, name="import-job-heartbeat", daemon=True)
+    thread.start()
+    return thread
+
+
+def submit_import_job(job_id: str, source: IO[bytes]):
+    with _active_lock:
+        _active_jobs.add(job_id)
+    _executor.submit(run_import_job, job_id, source)
+
+
+def _get_job(db: Session, job_id: str, current_user: dict) -> ImportJob:
+    role =current_user["role"]
+    if role not in ["HR","ADMIN"]:
+        raise HTTPException(status_code=401, detail="No access")
+    job = db.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+def _result_response(result: ImportJobResult) -> dict:
+    return {"employee_number": result.employee_number, "status": result.status, "message": result.message}
+
+
+@router.get("/imports/{job_id}")
+def get_import_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    job = _get_job(db, job_id, current_user)
+
+    errors = db.query(ImportJobResult).filter(
+        ImportJobResult.job_id == job_id,
+        ImportJobResult.status == "error"
+    ).order_by(ImportJobResult.id).limit(JOB_STATUS_ERRORS).all()
+
+    return {
+        "job_id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "created_by": job.created_by,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "total": job.total,
+        "processed": job.processed,
+        "success_count": job.success_count,
+        "error_count": job.error_count,
+        "error": job.error,
+        "errors": [_result_response(r) for r in errors]
+    }
+
+
+@router.get("/imports/{job_id}/results")
+def get_import_job_results(
+    job_id: str,
+    response: Response,
+    status: Optional[str] = None,
+    page: KeysetParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    _get_job(db, job_id, current_user)
+
+    query = db.query(ImportJobResult).filter(ImportJobResult.job_id == job_id)
+    if status is not None:
+        query = query.filter(ImportJobResult.status == status)
+    results, next_cursor = keyset_paginate(query.order_by(ImportJobResult.id), ImportJobResult.id, page)
+    response.headers.update(page_headers(next_cursor))
+    return [_result_response(r) for r in results]
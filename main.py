@@ -1,8 +1,11 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import auth
 import competency
-from database import engine, Base
+from database import engine, database_self_check
 import department
 from sqlalchemy.orm import Session
 import stats
@@ -12,9 +15,46 @@ import employee
 import role
 import employeeCompetencyAssign
 import competecnyScore,employeeExcel
+import scoreHistory
+import importJobs
+import exports
+from pagination import NEXT_CURSOR_HEADER
+from migrations import init_db
+from conditionalGet import etag_middleware
+from excelParser import shutdown_parse_pool
+from readReplica import start_replica_refresher, track_writes
+from uploads import LimitUploadSize
 
 
-app = FastAPI()
+# Create missing tables, indexes and rollups when a worker starts. Turn off
+# when deployments run 'python manage.py init-db' themselves.
+INIT_DB_ON_STARTUP = os.getenv("INIT_DB_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+
+def startup():
+    # Report the effective database settings
+    print("Database settings:", database_self_check(engine))
+
+    if INIT_DB_ON_STARTUP:
+        init_db(engine)
+
+    # Keep this process's import jobs alive and fail those whose worker is gone
+    importJobs.start_import_job_heartbeat()
+
+    # Keep local SQLite read replicas, if any are configured, close to the primary
+    start_replica_refresher()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(startup)
+    yield
+    shutdown_parse_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+# Added before CORS, so CORS wraps it and browsers can read its 413s
+app.add_middleware(LimitUploadSize)
 origins = [
     "http://localhost:5173",  # React app running on Vite
     "http://127.0.0.1:5173",  # Alternative localhost
@@ -26,12 +66,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],  # Lets the frontend read pagination cursors and ETags
 )
+app.middleware("http")(etag_middleware)
+app.middleware("http")(track_writes)
 
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 # Include authentication routes
 app.include_router(auth.router)
 app.include_router(role.router)
@@ -46,6 +86,9 @@ app.include_router(employeeCompetencyAssign.router)
 app.include_router(employeeSetEvaluation.router)
 app.include_router(competecnyScore.router)
 app.include_router(employeeExcel.router)
+app.include_router(scoreHistory.router)
+app.include_router(importJobs.router)
+app.include_router(exports.router)
 
 
 
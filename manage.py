@@ -0,0 +1,80 @@
+import argparse
+from database import SessionLocal, engine, Base
+import models
+
+
+def init_db(args):
+    from migrations import init_db as create_schema
+
+    create_schema(engine)
+    print("Database tables, indexes and rollups are in place.")
+
+
+def seed_admin(args):
+    from admin import seed_admin as create_admin
+
+    with SessionLocal() as db:
+        if create_admin(db):
+            print("Admin user created.")
+        else:
+            print("Admin already exists.")
+
+
+def rebuild_rollups(args):
+    from statsRollup import rebuild_rollups as rebuild
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rows = rebuild(db)
+        print(f"Rebuilt competency statistics rollups ({rows} rows).")
+    finally:
+        db.close()
+
+
+def migrate(args):
+    from migrations import migrate as run_migrations
+
+    removed = run_migrations(engine)
+    for table, count in removed.items():
+        print(f"Removed {count} duplicate rows from {table}.")
+    print("Database is up to date.")
+
+
+def refresh_replica(args):
+    from readReplica import refresh_sqlite_replicas
+
+    count = refresh_sqlite_replicas()
+    print(f"Refreshed {count} SQLite replica(s) from the primary database.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Competency management maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser(
+        "init-db", help="Create missing tables and indexes and fill the stats rollups"
+    ).set_defaults(func=init_db)
+
+    commands.add_parser(
+        "seed-admin", help="Create the default admin user if it doesn't exist"
+    ).set_defaults(func=seed_admin)
+
+    commands.add_parser(
+        "rebuild-rollups", help="Recompute the competency statistics rollups from employee_competencies"
+    ).set_defaults(func=rebuild_rollups)
+
+    commands.add_parser(
+        "migrate", help="Create missing tables and indexes, removing duplicate rows that block unique indexes"
+    ).set_defaults(func=migrate)
+
+    commands.add_parser(
+        "refresh-replica", help="Copy the primary SQLite database into the SQLite replicas in REPLICA_DATABASE_URLS"
+    ).set_defaults(func=refresh_replica)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
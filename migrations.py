@@ -0,0 +1,85 @@
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+from database import Base
+import models
+
+
+# Unique indexes added after databases with duplicate rows already existed,
+# as (model, key columns). migrate() removes the duplicates before creating them.
+UNIQUE_KEYS = [
+    (models.EmployeeCompetency, ("employee_number", "competency_code")),
+    (models.RoleCompetency, ("role_code", "competency_code")),
+]
+
+
+def ensure_indexes(engine: Engine):
+    """
+    Create indexes declared on the models that an existing database is missing.
+    create_all only creates indexes together with new tables, and reflection
+    can't see expression indexes, so this relies on IF NOT EXISTS instead.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+            except IntegrityError:
+                # A unique index over rows that still have duplicates
+                print(f"Could not create {index.name}: duplicate rows in {table.name}, run 'python manage.py migrate'")
+
+
+def init_db(engine: Engine):
+    """Create missing tables and indexes and fill the stats rollups of databases that predate them."""
+    from database import SessionLocal
+    from statsRollup import ensure_rollups
+
+    Base.metadata.create_all(bind=engine)
+    ensure_indexes(engine)
+    with SessionLocal() as db:
+        ensure_rollups(db)
+
+
+def remove_duplicates(conn, model, columns) -> int:
+    """Delete rows repeating the key of an earlier row, keeping the lowest id. Returns the rows deleted."""
+    key = [getattr(model, column) for column in columns]
+    keep = select(func.min(model.id)).group_by(*key)
+    result = conn.execute(
+        delete(model).where(
+            and_(*[column.isnot(None) for column in key]),
+            model.id.not_in(keep)
+        )
+    )
+    return result.rowcount
+
+
+def migrate(engine: Engine) -> dict:
+    """
+    Bring an existing database up to the current models: new tables, duplicate
+    rows removed, missing indexes created, stats rollups filled. Returns the
+    rows deleted per table.
+    """
+    from database import SessionLocal
+    from dataVersion import bump_data_version
+    from statsRollup import ensure_rollups, rebuild_rollups
+
+    Base.metadata.create_all(bind=engine)
+
+    removed = {}
+    with engine.begin() as conn:
+        for model, columns in UNIQUE_KEYS:
+            removed[model.__tablename__] = remove_duplicates(conn, model, columns)
+
+    ensure_indexes(engine)
+
+    changed = [table for table, count in removed.items() if count]
+    with SessionLocal() as db:
+        if "employee_competencies" in changed:
+            # The rollups still count the deleted rows
+            rebuild_rollups(db)
+        # Databases older than the rollup table have none yet
+        ensure_rollups(db)
+    if changed:
+        bump_data_version(*changed)
+    return removed
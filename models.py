@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Date, Integer, String, ForeignKey
+from sqlalchemy import Boolean, Column, Date, DateTime, Integer, String, Text, ForeignKey, Index, UniqueConstraint
 from database import Base
 
 
@@ -13,7 +13,8 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     role = Column(String)  # HR or HOD
-    department_code = Column(Integer, ForeignKey("departments.department_code"))
+    # No foreign key: admin accounts use codes that aren't departments
+    department_code = Column(String)
 
 
 
@@ -42,6 +43,10 @@ class Competency(Base):
 
 class RoleCompetency(Base):
     __tablename__ = "role_competencies"
+    __table_args__ = (
+        Index("uq_role_competencies_role_competency", "role_code", "competency_code", unique=True),
+        Index("ix_role_competencies_competency_covering", "competency_code", "role_code", "required_score"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     role_code = Column(String, ForeignKey("roles.role_code"))
     competency_code = Column(String, ForeignKey("competencies.code"))
@@ -74,6 +79,15 @@ class ManagingEmployee(Base):
 
 class EmployeeCompetency(Base):
     __tablename__ = "employee_competencies"
+    __table_args__ = (
+        # One row per employee and competency; also serves per-employee lookups
+        Index("uq_employee_competencies_employee_competency", "employee_number", "competency_code", unique=True),
+        # Per-competency stats read everything they need from this index
+        Index(
+            "ix_employee_competencies_competency_covering",
+            "competency_code", "employee_number", "required_score", "actual_score"
+        ),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True, index=True,)
     employee_number = Column(String, ForeignKey("employees.employee_number"))
     competency_code = Column(String, ForeignKey("competencies.code"))
@@ -81,10 +95,92 @@ class EmployeeCompetency(Base):
     actual_score = Column(Integer,default=0)
 
 
-
-
-
-
-
-
-
+# Lets /score-emp-details/by-competency?top=K read the K largest gaps of a
+# competency straight off the index, ties broken by employee number
+Index(
+    "ix_employee_competencies_competency_gap",
+    EmployeeCompetency.competency_code,
+    (EmployeeCompetency.required_score - EmployeeCompetency.actual_score).desc(),
+    EmployeeCompetency.employee_number,
+)
+
+
+
+class EmployeeCompetencyScoreHistory(Base):
+    # Append-only log of every score submitted through an evaluation. No
+    # foreign keys so the history outlives deleted employees and competencies.
+    __tablename__ = "employee_competency_score_history"
+    __table_args__ = (
+        Index("ix_score_history_employee_competency_time", "employee_number", "competency_code", "evaluated_at"),
+        Index("ix_score_history_competency_time", "competency_code", "evaluated_at"),
+        Index("ix_score_history_department_time", "department_code", "evaluated_at"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    employee_number = Column(String, nullable=False)
+    competency_code = Column(String, nullable=False)
+    department_code = Column(String, nullable=True)  # employee's department at evaluation time
+    required_score = Column(Integer)
+    previous_score = Column(Integer, nullable=True)
+    actual_score = Column(Integer)
+    evaluated_by = Column(String)  # evaluator's employee number
+    evaluated_at = Column(DateTime, nullable=False)
+
+
+
+class ImportJob(Base):
+    # A background Excel import, see importJobs.py
+    __tablename__ = "import_jobs"
+    id = Column(String, primary_key=True)  # uuid4 hex
+    filename = Column(String)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed or failed
+    created_by = Column(String)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # last beat from the worker process that owns the job
+    total = Column(Integer, nullable=True)  # sheets in the workbook, known once parsed
+    processed = Column(Integer, default=0)
+    success_count = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    error = Column(Text, nullable=True)  # why the job failed as a whole
+
+
+
+class ImportJobResult(Base):
+    # One per employee record of an import job, in workbook order
+    __tablename__ = "import_job_results"
+    __table_args__ = (
+        Index("ix_import_job_results_job_id_id", "job_id", "id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String, ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=False)
+    employee_number = Column(String)
+    status = Column(String)  # success or error
+    message = Column(Text)
+
+
+
+class DataVersion(Base):
+    # Per-table write counters shared by all workers, see dataVersion.py
+    __tablename__ = "data_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+
+class CompetencyDepartmentRollup(Base):
+    # Running totals of employee_competencies per (competency, department),
+    # kept up to date by the write paths through statsRollup.RollupDelta
+    __tablename__ = "competency_department_rollups"
+    __table_args__ = (UniqueConstraint("competency_code", "department_code"),)
+    id = Column(Integer, primary_key=True, index=True)
+    competency_code = Column(String, ForeignKey("competencies.code"), index=True)
+    department_code = Column(String, nullable=True, index=True)  # NULL for rows without an employee
+    employee_count = Column(Integer, default=0)
+    scored_count = Column(Integer, default=0)  # rows with an actual_score
+    score_sum = Column(Integer, default=0)
+    meeting_required = Column(Integer, default=0)
+    gap1 = Column(Integer, default=0)
+    gap2 = Column(Integer, default=0)
+    gap3 = Column(Integer, default=0)
+    gap4_plus = Column(Integer, default=0)
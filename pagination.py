@@ -0,0 +1,94 @@
+import os
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, Query
+from sqlalchemy import Integer
+from sqlalchemy.orm import Query as SAQuery
+from models import Employee
+
+
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class KeysetParams:
+    """
+    ?limit=&after= query parameters for keyset pagination over a primary key.
+    Without limit the whole (filtered) result is returned, as before.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+        after: Optional[str] = Query(None, description="Return rows whose key is greater than this cursor"),
+    ):
+        self.limit = limit
+        self.after = after
+
+    def cache_params(self) -> dict:
+        return {"limit": self.limit, "after": self.after}
+
+
+def _cursor_value(key_column, after: str) -> Any:
+    if isinstance(key_column.type, Integer):
+        try:
+            return int(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {after}")
+    return after
+
+
+def keyset_paginate(query: SAQuery, key_column, page: KeysetParams, key_name: Optional[str] = None) -> Tuple[List, Optional[str]]:
+    """
+    Apply ?after= and ?limit= to a query ordered by key_column.
+    Returns the rows and the cursor of the next page (None on the last page).
+    """
+    query = keyset_filter(query, key_column, page)
+    if page.limit is None:
+        return query.all(), None
+
+    rows = query.limit(page.limit + 1).all()
+    if len(rows) <= page.limit:
+        return rows, None
+    rows = rows[:page.limit]
+    return rows, str(getattr(rows[-1], key_name or key_column.key))
+
+
+def keyset_filter(query: SAQuery, key_column, page: KeysetParams) -> SAQuery:
+    """The ordering and cursor part of keyset_paginate, for callers that stream the rows themselves."""
+    if page.after is not None:
+        query = query.filter(key_column > _cursor_value(key_column, page.after))
+    if page.after is not None or page.limit is not None:
+        query = query.order_by(key_column)
+    return query
+
+
+def next_page_cursor(query: SAQuery, key_column, page: KeysetParams) -> Optional[str]:
+    """
+    The cursor keyset_paginate would return for this page, looked up without
+    loading the page: for streamed responses, whose headers go out first.
+    """
+    if page.limit is None:
+        return None
+    keys = keyset_filter(query, key_column, page).with_entities(key_column).offset(page.limit - 1).limit(2).all()
+    return str(keys[0][0]) if len(keys) == 2 else None
+
+
+def page_headers(next_cursor: Optional[str]) -> dict:
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor is not None else {}
+
+
+def filter_employees(
+    query: SAQuery,
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    evaluation_status: Optional[bool] = None,
+) -> SAQuery:
+    """Employee filters shared by the list endpoints. The query must already select or join Employee."""
+    if department_code is not None:
+        query = query.filter(Employee.department_code == department_code)
+    if role_code is not None:
+        query = query.filter(Employee.role_code == role_code)
+    if evaluation_status is not None:
+        query = query.filter(Employee.evaluation_status == evaluation_status)
+    return query
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from typing import List, Optional
+from fastapi import Depends, Request
+from jose import JWTError, jwt
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from database import AsyncSessionLocal, SessionLocal, async_database_url, configure_sqlite, engine, engine_options
+from dataVersion import current_table_versions
+from lruCache import LRUCache
+from models import DataVersion
+from security import ALGORITHM, SECRET_KEY
+
+# Read-only endpoints can be served from replicas of the primary database.
+# Comma separated SQLAlchemy URLs; without any, everything uses the primary.
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+
+# After a user's write, their reads go to the primary for this many seconds
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# How often a replica's data_versions are compared with the primary's
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "1"))
+
+# How often SQLite replica files are refreshed from the primary, 0 to turn off
+REPLICA_REFRESH_SECONDS = float(os.getenv("REPLICA_REFRESH_SECONDS", "30"))
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class Replica:
+    """Sync and async engines for one replica, and how far it has caught up."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_engine(url, **engine_options(url))
+        configure_sqlite(self.engine)
+        async_url = async_database_url(url)
+        self.async_engine = create_async_engine(async_url, **engine_options(async_url))
+        configure_sqlite(self.async_engine.sync_engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.AsyncSessionLocal = async_sessionmaker(
+            self.async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+        self._versions = None
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def is_current(self) -> bool:
+        """
+        True when the replica has every write this worker knows about. The
+        data_versions table is replicated with the data, so comparing it with
+        the primary's versions keeps ETags and cached responses consistent
+        with what the replica returns.
+        """
+        now = time.monotonic()
+        if now - self._checked_at >= REPLICA_CHECK_SECONDS:
+            try:
+                with self.engine.connect() as conn:
+                    self._versions = dict(conn.execute(select(DataVersion.name, DataVersion.version)).all())
+            except SQLAlchemyError:
+                # Unreachable or not initialised yet
+                self._versions = None
+            self._checked_at = now
+        if self._versions is None:
+            return False
+        return all(self._versions.get(table, 0) >= version for table, version in current_table_versions().items())
+
+
+replicas: List[Replica] = [Replica(url) for url in REPLICA_DATABASE_URLS]
+_next_replica = 0
+_next_lock = threading.Lock()
+
+# Users who wrote recently, by token subject
+_recent_writers = LRUCache(max_entries=10000, ttl=READ_YOUR_WRITES_SECONDS)
+
+
+def _writer_key(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    token = authorization[7:]
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub") or token
+    except JWTError:
+        return token
+
+
+async def track_writes(request: Request, call_next):
+    """Middleware remembering who just wrote, so their next reads see it."""
+    response = await call_next(request)
+    if replicas and request.method not in SAFE_METHODS:
+        key = _writer_key(request)
+        if key is not None:
+            _recent_writers.set(key, True)
+    return response
+
+
+def choose_replica(request: Request) -> Optional[Replica]:
+    """Round-robin over the replicas that are caught up; None means the primary."""
+    global _next_replica
+    if not replicas:
+        return None
+    key = _writer_key(request)
+    if key is not None and _recent_writers.get(key):
+        return None
+
+    with _next_lock:
+        start = _next_replica
+        _next_replica = (_next_replica + 1) % len(replicas)
+    for i in range(len(replicas)):
+        replica = replicas[(start + i) % len(replicas)]
+        if replica.is_current():
+            return replica
+    return None
+
+
+def get_read_db(replica: Optional[Replica] = Depends(choose_replica)):
+    """get_db for read-only endpoints."""
+    db = (replica.SessionLocal if replica else SessionLocal)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(replica: Optional[Replica] = Depends(choose_replica)):
+    """get_async_db for read-only endpoints."""
+    async with (replica.AsyncSessionLocal if replica else AsyncSessionLocal)() as db:
+        yield db
+
+
+def refresh_sqlite_replicas() -> int:
+    """
+    Copy the primary SQLite database into every SQLite replica with the
+    backup API. Returns the number of replicas refreshed.
+    """
+    if engine.dialect.name != "sqlite":
+        return 0
+    refreshed = 0
+    for replica in replicas:
+        if replica.engine.dialect.name != "sqlite":
+            continue
+        source = engine.raw_connection()
+        try:
+            target = replica.engine.raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+        finally:
+            source.close()
+        replica.invalidate()
+        refreshed += 1
+    return refreshed
+
+
+def start_replica_refresher() -> Optional[threading.Thread]:
+    """Refresh SQLite replicas now and then every REPLICA_REFRESH_SECONDS in a background thread."""
+    if REPLICA_REFRESH_SECONDS <= 0 or not refresh_sqlite_replicas():
+        return None
+
+    def refresh_forever():
+        while True:
+            time.sleep(REPLICA_REFRESH_SECONDS)
+            try:
+                refresh_sqlite_replicas()
+            except Exception as e:
+                print(f"Replica refresh failed: {e}")
+
+    thread = threading.Thread(target=refresh_forever, name="replica-refresher", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,47 @@
+import os
+from typing import Any, Hashable, Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from dataVersion import cached_data_version
+from lruCache import LRUCache
+
+
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "512"))
+STATS_CACHE_MAX_BYTES = int(os.getenv("STATS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "0")) or None
+
+
+class ResponseCache:
+    """
+    Caches rendered JSON bodies keyed by endpoint, parameters, caller role and
+    the current data version. Writes bump the data version, so entries built
+    from older data are never matched again and age out of the LRU.
+
+    key() runs on the event loop and doesn't sync the version itself;
+    routers using the cache depend on dataVersion.sync_data_versions.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl=None):
+        self.entries = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+
+    def key(self, endpoint: str, params: dict, role: str) -> Hashable:
+        return (endpoint, tuple(sorted(params.items())), role, cached_data_version())
+
+    def get(self, key: Hashable):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        body, headers = entry
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def store(self, key: Hashable, content: Any, headers: Optional[dict] = None) -> Response:
+        body = JSONResponse(content=jsonable_encoder(content)).body
+        self.entries.set(key, (body, headers), size=len(body))
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+stats_cache = ResponseCache(
+    max_entries=STATS_CACHE_MAX_ENTRIES,
+    max_bytes=STATS_CACHE_MAX_BYTES,
+    ttl=STATS_CACHE_TTL_SECONDS,
+)
@@ -6,6 +6,8 @@ from sqlalchemy.orm import Session
 from fastapi import APIRouter
 from auth import get_current_user
 from database import get_db
+from dataVersion import bump_data_version
+from conditionalGet import conditional_get
 from models import Competency, Employee, Role, RoleCompetency
 from schemas import CompetencyOut, RoleCreate, RoleResponse
 
@@ -27,12 +29,13 @@ def create_role(role_data: RoleCreate, db: Session = Depends(get_db), current_us
     new_role = Role(role_code = role_data.role_code,name=role_data.name)
     db.add(new_role)
     db.commit()
+    bump_data_version("roles")
     db.refresh(new_role)
 
     return new_role
 
 
-@router.get("/roles", response_model=List[RoleResponse])
+@router.get("/roles", response_model=List[RoleResponse], dependencies=[conditional_get("roles")])
 def get_all_roles(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
     roles = db.query(Role).filter(and_(Role.role_code!="HR",Role.role_code!="HOD")).all()
     return roles
@@ -62,6 +65,7 @@ def update_role(role_id: int, role_data: RoleCreate, db: Session = Depends(get_d
     role.role_code = role_data.role_code
     role.name = role_data.name
     db.commit()
+    bump_data_version("roles")
     db.refresh(role)
 
     return role
@@ -85,6 +89,7 @@ def delete_role(role_id: int, db: Session = Depends(get_db), current_user: dict
         )
     db.delete(role)
     db.commit()
+    bump_data_version("roles")
 
     return {"message": "Role deleted successfully"}
 
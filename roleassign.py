@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from fastapi import APIRouter
 from auth import get_current_user
 from database import get_db
+from dataVersion import bump_data_version
 from models import Competency, Role, RoleCompetency
 from schemas import CompetencyOut, RoleCreate, RoleResponse
 
@@ -90,6 +91,7 @@ def assign_competencies_to_role(
         db.add(rc)
     
     db.commit()
+    bump_data_version("role_competencies")
     return list(new_codes)
 
 
@@ -117,6 +119,7 @@ def remove_competencies_from_role(
     ).delete(synchronize_session=False)
     
     db.commit()
+    bump_data_version("role_competencies")
     
     if result == 0:
         raise HTTPException(
@@ -0,0 +1,189 @@
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from dataVersion import data_version
+from models import Employee, EmployeeCompetency
+
+
+# Columns that can be grouped on, in the order they are loaded
+GROUP_KEYS = ["employee", "department", "role", "competency"]
+METRICS = ["actual", "gap"]
+PERCENTILES = {"p10": 0.10, "median": 0.50, "p90": 0.90}
+
+
+class ScoreFrame:
+    """
+    Column arrays of every employee competency score.
+
+    Key columns are stored as integer codes into the matching labels list,
+    scores as float arrays with NaN for missing values.
+    """
+
+    def __init__(self, version: int, codes: Dict[str, np.ndarray], labels: Dict[str, list],
+                 required: np.ndarray, actual: np.ndarray):
+        self.version = version
+        self.codes = codes
+        self.labels = labels
+        self.required = required
+        self.actual = actual
+
+    def __len__(self):
+        return len(self.actual)
+
+
+def _factorize(values: list):
+    """Integer codes and labels of a key column. None gets its own label, last."""
+    column = np.array(values, dtype=object)
+    missing = np.equal(column, None)
+    labels, inverse = np.unique(column[~missing].astype(str), return_inverse=True)
+    codes = np.full(len(column), len(labels), dtype=np.int64)
+    codes[~missing] = inverse
+    labels = labels.tolist()
+    if missing.any():
+        labels.append(None)
+    return codes, labels
+
+
+def _scores(values: list) -> np.ndarray:
+    # None becomes NaN in a float conversion of an object array
+    return np.array(values, dtype=object).astype(np.float64)
+
+
+def _load_frame(db: Session, version: int) -> ScoreFrame:
+    rows = (
+        db.query(
+            EmployeeCompetency.employee_number,
+            Employee.department_code,
+            Employee.role_code,
+            EmployeeCompetency.competency_code,
+            EmployeeCompetency.required_score,
+            EmployeeCompetency.actual_score
+        )
+        .outerjoin(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
+        .all()
+    )
+    columns = list(zip(*rows)) if rows else [()] * 6
+
+    codes, labels = {}, {}
+    for key, values in zip(GROUP_KEYS, columns[:4]):
+        codes[key], labels[key] = _factorize(values)
+
+    return ScoreFrame(version, codes, labels, _scores(columns[4]), _scores(columns[5]))
+
+
+_frame: Optional[ScoreFrame] = None
+_frame_lock = threading.Lock()
+
+
+def score_frame(bind=None) -> ScoreFrame:
+    """
+    The score arrays for the current data version, loaded at most once per
+    version. Blocking: call it with run_in_threadpool. bind picks another
+    engine, e.g. a replica.
+    """
+    global _frame
+    version = data_version()
+    frame = _frame
+    if frame is not None and frame.version == version:
+        return frame
+    with _frame_lock:
+        # Another request may have loaded it while this one waited
+        if _frame is not None and _frame.version >= version:
+            return _frame
+        db = SessionLocal(bind=bind) if bind is not None else SessionLocal()
+        try:
+            _frame = _load_frame(db, version)
+        finally:
+            db.close()
+        return _frame
+
+
+def parse_group_by(spec: str) -> List[str]:
+    keys = [k.strip() for k in spec.split(",") if k.strip()]
+    unknown = [k for k in keys if k not in GROUP_KEYS]
+    if unknown or not keys:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be a comma separated list of {', '.join(GROUP_KEYS)}"
+        )
+    return list(dict.fromkeys(keys))
+
+
+def _grouped_percentile(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    # Linear interpolation between closest ranks, like np.percentile's default
+    position = starts + q * (counts - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    fraction = position - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def score_distributions(frame: ScoreFrame, group_by: List[str], metric: str = "actual") -> List[dict]:
+    """
+    Count, mean, standard deviation, min/p10/median/p90/max and a histogram of
+    the metric for every combination of the group_by keys present in the data.
+    """
+    if metric == "gap":
+        values = frame.required - frame.actual
+    else:
+        values = frame.actual
+    present = ~np.isnan(values)
+    values = values[present]
+    if values.size == 0:
+        return []
+
+    key_codes = [frame.codes[key][present] for key in group_by]
+    dims = [max(len(frame.labels[key]), 1) for key in group_by]
+    combined = np.ravel_multi_index(key_codes, dims)
+    group_ids, group = np.unique(combined, return_inverse=True)
+    group_count = len(group_ids)
+
+    counts = np.bincount(group, minlength=group_count)
+    sums = np.bincount(group, weights=values, minlength=group_count)
+    squares = np.bincount(group, weights=values * values, minlength=group_count)
+    means = sums / counts
+    stds = np.sqrt(np.maximum(squares / counts - means * means, 0))
+
+    # Sort by group, then value, so each group is a contiguous sorted run
+    order = np.lexsort((values, group))
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    minimums = sorted_values[starts]
+    maximums = sorted_values[starts + counts - 1]
+    percentiles = {
+        name: _grouped_percentile(sorted_values, starts, counts, q)
+        for name, q in PERCENTILES.items()
+    }
+
+    # Scores are whole numbers, so one histogram bin per score value. Only
+    # the (group, bin) pairs present are counted: scores aren't range checked,
+    # and an array sized by the score range could be huge
+    bins, bin_counts = np.unique(
+        np.stack([group, np.floor(values).astype(np.int64)]), axis=1, return_counts=True
+    )
+    bin_starts = np.searchsorted(bins[0], np.arange(group_count + 1))
+
+    group_keys = np.unravel_index(group_ids, dims)
+    result = []
+    for i in range(group_count):
+        entry = {key: frame.labels[key][group_keys[k][i]] for k, key in enumerate(group_by)}
+        entry.update({
+            "count": int(counts[i]),
+            "mean": round(float(means[i]), 2),
+            "std": round(float(stds[i]), 2),
+            "min": float(minimums[i]),
+            **{name: round(float(values_[i]), 2) for name, values_ in percentiles.items()},
+            "max": float(maximums[i]),
+            "histogram": {
+                str(b): int(c) for b, c in zip(
+                    bins[1][bin_starts[i]:bin_starts[i + 1]], bin_counts[bin_starts[i]:bin_starts[i + 1]]
+                )
+            },
+        })
+        result.append(entry)
+
+    result.sort(key=lambda e: [(e[key] is None, str(e[key])) for key in group_by])
+    return result
@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from auth import get_current_user
+from readReplica import get_read_db
+from conditionalGet import conditional_get
+from models import EmployeeCompetencyScoreHistory
+
+
+router = APIRouter()
+
+HISTORY_TABLES = ("employee_competency_score_history",)
+HISTORY_BATCH_SIZE = 1000
+
+# strftime formats used to label trend buckets
+INTERVALS = {
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m",
+    "year": "%Y",
+}
+
+
+def _history_range(query, start: Optional[datetime], end: Optional[datetime]):
+    # Bounds on evaluated_at, the last column of every history index, keep
+    # these queries as index range scans
+    if start is not None:
+        query = query.filter(EmployeeCompetencyScoreHistory.evaluated_at >= start)
+    if end is not None:
+        query = query.filter(EmployeeCompetencyScoreHistory.evaluated_at < end)
+    return query
+
+
+def _trend(query, interval: str):
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {', '.join(INTERVALS)}")
+    period_format = INTERVALS[interval]
+
+    # Rows arrive in evaluated_at order, so buckets are filled in period order
+    buckets = OrderedDict()
+    rows = query.with_entities(
+        EmployeeCompetencyScoreHistory.evaluated_at,
+        EmployeeCompetencyScoreHistory.required_score,
+        EmployeeCompetencyScoreHistory.actual_score
+    ).order_by(EmployeeCompetencyScoreHistory.evaluated_at).yield_per(HISTORY_BATCH_SIZE)
+
+    for row in rows:
+        period = row.evaluated_at.strftime(period_format)
+        bucket = buckets.setdefault(period, {"evaluations": 0, "scoreSum": 0, "scored": 0, "gapSum": 0, "gapCount": 0, "meetingRequired": 0})
+        bucket["evaluations"] += 1
+        if row.actual_score is not None:
+            bucket["scored"] += 1
+            bucket["scoreSum"] += row.actual_score
+        if row.actual_score is not None and row.required_score is not None:
+            bucket["gapCount"] += 1
+            bucket["gapSum"] += row.required_score - row.actual_score
+            if row.actual_score >= row.required_score:
+                bucket["meetingRequired"] += 1
+
+    return [{
+        "period": period,
+        "evaluations": b["evaluations"],
+        "averageScore": round(b["scoreSum"] / b["scored"], 2) if b["scored"] else None,
+        "averageGap": round(b["gapSum"] / b["gapCount"], 2) if b["gapCount"] else None,
+        "meetingRequired": b["meetingRequired"],
+    } for period, b in buckets.items()]
+
+
+@router.get("/history/employees/{employee_number}", dependencies=[conditional_get(*HISTORY_TABLES)])
+def get_employee_score_history(
+    employee_number: str,
+    competency_code: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    role =current_user["role"]
+    if role not in ["HR","ADMIN","HOD","EMPLOYEE"]:
+        raise HTTPException(status_code=401, detail="No access")
+
+    query = db.query(EmployeeCompetencyScoreHistory).filter(
+        EmployeeCompetencyScoreHistory.employee_number == employee_number
+    )
+    if competency_code is not None:
+        query = query.filter(EmployeeCompetencyScoreHistory.competency_code == competency_code)
+    query = _history_range(query, start, end)
+
+    history = query.order_by(
+        EmployeeCompetencyScoreHistory.competency_code,
+        EmployeeCompetencyScoreHistory.evaluated_at,
+        EmployeeCompetencyScoreHistory.id
+    ).all()
+
+    return [{
+        "competency_code": h.competency_code,
+        "required_score": h.required_score,
+        "previous_score": h.previous_score,
+        "actual_score": h.actual_score,
+        "gap": h.required_score - h.actual_score if h.required_score is not None and h.actual_score is not None else None,
+        "evaluated_by": h.evaluated_by,
+        "evaluated_at": h.evaluated_at.isoformat()
+    } for h in history]
+
+
+@router.get("/history/competencies/{competency_code}/trend", dependencies=[conditional_get(*HISTORY_TABLES)])
+def get_competency_trend(
+    competency_code: str,
+    interval: str = "month",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    role =current_user["role"]
+    if role not in ["HR","ADMIN","HOD"]:
+        raise HTTPException(status_code=401, detail="No access")
+
+    query = db.query(EmployeeCompetencyScoreHistory).filter(
+        EmployeeCompetencyScoreHistory.competency_code == competency_code
+    )
+    return {
+        "competencyCode": competency_code,
+        "interval": interval,
+        "trend": _trend(_history_range(query, start, end), interval)
+    }
+
+
+@router.get("/history/departments/{department_code}/trend", dependencies=[conditional_get(*HISTORY_TABLES)])
+def get_department_trend(
+    department_code: str,
+    interval: str = "month",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    role =current_user["role"]
+    if role not in ["HR","ADMIN","HOD"]:
+        raise HTTPException(status_code=401, detail="No access")
+    if role == "HOD" and department_code != current_user["department_code"]:
+        raise HTTPException(status_code=401, detail="No access")
+
+    query = db.query(EmployeeCompetencyScoreHistory).filter(
+        EmployeeCompetencyScoreHistory.department_code == department_code
+    )
+    return {
+        "departmentCode": department_code,
+        "interval": interval,
+        "trend": _trend(_history_range(query, start, end), interval)
+    }
@@ -1,71 +1,80 @@
 # analytics.py
-from fastapi import APIRouter, Depends, HTTPException
+from itertools import groupby
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel
-from sqlalchemy import case, func
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Any, Optional
 from auth import get_current_user
-from database import get_db
+from readReplica import Replica, choose_replica, get_async_read_db
 from models import Department, Employee, EmployeeCompetency, Competency, RoleCompetency
-
-router = APIRouter()
-
-
-@router.get("/fetch-all-competency-score-data")
-def get_competency_gap_data(db: Session = Depends(get_db),
+from statsAggregation import DEFAULT_GAP_BUCKETS, competency_gap_histogram, parse_gap_buckets
+from statsRollup import average_score, competency_totals, department_competency_totals
+from responseCache import stats_cache
+from streaming import aiter_query_rows, negotiate_format, streaming_response
+from pagination import MAX_PAGE_SIZE, KeysetParams, filter_employees, keyset_filter, keyset_paginate, next_page_cursor, page_headers
+from scoreAnalytics import METRICS, parse_group_by, score_distributions, score_frame
+from conditionalGet import conditional_get
+from dataVersion import sync_data_versions
+
+# Other workers' writes are picked up off the event loop before each request
+router = APIRouter(dependencies=[Depends(sync_data_versions)])
+
+# Tables the stats responses are derived from, for ETags
+STATS_TABLES = ("employees", "employee_competencies", "competencies")
+DEPARTMENT_STATS_TABLES = STATS_TABLES + ("departments",)
+
+
+@router.get("/fetch-all-competency-score-data", dependencies=[conditional_get(*STATS_TABLES)])
+async def get_competency_gap_data(
+    buckets: str = Query(DEFAULT_GAP_BUCKETS, description='Gap buckets, e.g. "1,2,3,4+"; send "+" as %2B'),
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: dict = Depends(get_current_user)):
     role =current_user["role"] 
     if role not in [ "HR"]:
         raise HTTPException(status_code=401, detail="No access")  
-    competencies = db.query(Competency).all()
-    result = []
 
-    for comp in competencies:
-        gap1 = 0
-        gap2 = 0
-        gap3 = 0
-
-        # Get all employee competencies for this competency
-        records = db.query(EmployeeCompetency).filter(
-            EmployeeCompetency.competency_code == comp.code
-        ).all()
-
-        for record in records:
-            if record.required_score is not None and record.actual_score is not None:
-                gap = record.required_score - record.actual_score
-                if gap == 1:
-                    gap1 += 1
-                elif gap == 2:
-                    gap2 += 1
-                elif gap == 3:
-                    gap3 += 1
+    gap_buckets = parse_gap_buckets(buckets)
+    key = stats_cache.key(
+        "competency-gap-data",
+        {"buckets": buckets, "department_code": department_code, "role_code": role_code},
+        role
+    )
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
 
-        result.append({
-            "competencyCode": comp.code,
-            "competencyName": comp.name,
-            "gap1": gap1,
-            "gap2": gap2,
-            "gap3": gap3,
-            "totalGapEmployees": gap1 + gap2 + gap3
-        })
-    result.sort(key=lambda x: x["totalGapEmployees"], reverse=True)
+    result = await db.run_sync(competency_gap_histogram, gap_buckets, department_code=department_code, role_code=role_code)
+    return stats_cache.store(key, result)
 
-    return result
 
 
 
+EMPLOYEE_COMPETENCY_DETAIL_FIELDS = [
+    "employeeNumber",
+    "employeeName",
+    "competencyCode",
+    "competencyName",
+    "competencyDescription",
+    "requiredScore",
+    "actualScore",
+]
 
-@router.get("/employee-competencies/details")
-def get_all_employee_competency_details(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
-):
-    role = current_user["role"]
-    if role not in ["HOD", "HR"]:
-        raise HTTPException(status_code=401, detail="No access")
 
-    results = (
+def employee_competency_details_query(
+    db: Session,
+    competency_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    evaluation_status: Optional[bool] = None,
+):
+    query = (
         db.query(
+            EmployeeCompetency.id,
             Employee.employee_number,
             Employee.employee_name,
             Competency.code.label("competency_code"),
@@ -76,57 +85,131 @@ def get_all_employee_competency_details(
         )
         .join(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
         .join(Competency, Competency.code == EmployeeCompetency.competency_code)
-        .all()
     )
+    if competency_code is not None:
+        query = query.filter(EmployeeCompetency.competency_code == competency_code)
+    return filter_employees(query, department_code, role_code, evaluation_status)
+
+
+def employee_competency_detail(r) -> dict:
+    return {
+        "employeeNumber": r.employee_number,
+        "employeeName": r.employee_name,
+        "competencyCode": r.competency_code,
+        "competencyName": r.competency_name,
+        "competencyDescription": r.competency_description,
+        "requiredScore": r.required_score,
+        "actualScore": r.actual_score
+    }
 
-    return [
-        {
-            "employeeNumber": r.employee_number,
-            "employeeName": r.employee_name,
-            "competencyCode": r.competency_code,
-            "competencyName": r.competency_name,
-            "competencyDescription": r.competency_description,
-            "requiredScore": r.required_score,
-            "actualScore": r.actual_score
-        }
-        for r in results
-    ]
 
-@router.get("/score-emp-details/by-competency/{compcode}")
-def get_employee_gaps_by_competency(
+@router.get("/employee-competencies/details", dependencies=[conditional_get(*STATS_TABLES)])
+async def get_all_employee_competency_details(
+    request: Request,
+    output_format: Optional[str] = Query(None, alias="format", description="json, ndjson or csv"),
+    competency_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    evaluation_status: Optional[bool] = None,
+    page: KeysetParams = Depends(),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    role = current_user["role"]
+    if role not in ["HOD", "HR"]:
+        raise HTTPException(status_code=401, detail="No access")
+
+    # NDJSON/CSV are streamed in batches so memory stays flat for the whole organisation
+    filters = {
+        "competency_code": competency_code,
+        "department_code": department_code,
+        "role_code": role_code,
+        "evaluation_status": evaluation_status,
+    }
+    output_format = negotiate_format(request, output_format)
+    if output_format != "json":
+        def build_query(stream_db: Session):
+            query = keyset_filter(employee_competency_details_query(stream_db, **filters), EmployeeCompetency.id, page)
+            return query.limit(page.limit) if page.limit is not None else query
+
+        # Headers go out before the rows, so the next page's cursor is looked up first
+        next_cursor = await db.run_sync(lambda session: next_page_cursor(
+            employee_competency_details_query(session, **filters), EmployeeCompetency.id, page
+        ))
+
+        # Streamed from the same database this request was routed to
+        rows = aiter_query_rows(build_query, bind=db.bind)
+        return streaming_response(
+            (employee_competency_detail(r) async for r in rows),
+            output_format,
+            EMPLOYEE_COMPETENCY_DETAIL_FIELDS,
+            filename="employee-competency-details",
+            headers=page_headers(next_cursor)
+        )
+
+    key = stats_cache.key("employee-competency-details", {**filters, **page.cache_params()}, role)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+
+    results, next_cursor = await db.run_sync(lambda session: keyset_paginate(
+        employee_competency_details_query(session, **filters), EmployeeCompetency.id, page
+    ))
+
+    return stats_cache.store(
+        key,
+        [employee_competency_detail(r) for r in results],
+        headers=page_headers(next_cursor)
+    )
+
+@router.get("/score-emp-details/by-competency/{compcode}", dependencies=[conditional_get(*STATS_TABLES)])
+async def get_employee_gaps_by_competency(
     compcode: str,
-    db: Session = Depends(get_db),
+    top: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Only the K largest gaps"),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     role =current_user["role"] 
     if role not in [ "HR"]:
         raise HTTPException(status_code=401, detail="No access")  
-   
-    records = (
-        db.query(EmployeeCompetency, Employee)
+
+    key = stats_cache.key("employee-gaps-by-competency", {"compcode": compcode, "top": top}, role)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Filtering and ordering happen in the database on
+    # ix_employee_competencies_competency_gap; with ?top=K it walks the index
+    # in gap order and stops after K rows. Ties are ordered by employee number.
+    gap = EmployeeCompetency.required_score - EmployeeCompetency.actual_score
+    statement = (
+        select(
+            EmployeeCompetency.employee_number,
+            Employee.employee_name,
+            EmployeeCompetency.required_score,
+            EmployeeCompetency.actual_score,
+            gap.label("gap")
+        )
         .join(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
-        .filter(EmployeeCompetency.competency_code == compcode)
-        .all()
+        .where(EmployeeCompetency.competency_code == compcode, gap > 0)
+        .order_by(gap.desc(), EmployeeCompetency.employee_number)
     )
+    if top is not None:
+        statement = statement.limit(top)
+    gaps = (await db.execute(statement)).all()
 
-    result = []
-
-    for comp, emp in records:
-        if comp.required_score is not None and comp.actual_score is not None:
-            gap = comp.required_score - comp.actual_score
-            if gap > 0:
-                result.append({
-                    "employeeNumber": comp.employee_number,
-                    "employeeName": emp.employee_name,
-                    "requiredScore": comp.required_score,
-                    "actualScore": comp.actual_score,
-                    "gap": gap
-                })
-
-    # Sort by descending gap
-    result.sort(key=lambda x: x["gap"], reverse=True)
+    result = [
+        {
+            "employeeNumber": r.employee_number,
+            "employeeName": r.employee_name,
+            "requiredScore": r.required_score,
+            "actualScore": r.actual_score,
+            "gap": r.gap
+        }
+        for r in gaps
+    ]
 
-    return result
+    return stats_cache.store(key, result)
 
 
 
@@ -150,56 +233,8 @@ class CompetencyPerformance(BaseModel):
 
     
  
-@router.get("/stats/department-performance/{department_code}", response_model=Dict[str, Any])
-def get_competency_by_department_stats(
-    department_code: str,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
-
-):
-    role =current_user["role"] 
-    if role not in ["HR","ADMIN"]:
-        raise HTTPException(status_code=401, detail="No access")  
-    """
-    Get department performance statistics showing all competencies
-    for a specific department with rankings.
-    """
-    # Verify department exists
-    department = db.query(Department).filter(Department.department_code == department_code).first()
-    if not department:
-        raise HTTPException(status_code=404, detail=f"Department with code {department_code} not found")
-    
-    result = {}
-    
-    # Get all competencies with their average scores for this department
-    competency_stats = (
-        db.query(
-            Competency.code,
-            Competency.name,
-            Competency.description,
-            Competency.required_score,
-            func.avg(EmployeeCompetency.actual_score).label("average_score"),
-            func.sum(
-                case(
-                    (EmployeeCompetency.actual_score >= EmployeeCompetency.required_score, 1),
-                    else_=0
-                )
-            ).label("meeting_required"),
-            func.count(EmployeeCompetency.id).label("total_evaluations"),
-        )
-        .join(
-            EmployeeCompetency,
-            EmployeeCompetency.competency_code == Competency.code
-        )
-        .join(
-            Employee,
-            Employee.employee_number == EmployeeCompetency.employee_number
-        )
-        .filter(Employee.department_code == department_code)  # Filter by department code
-        .group_by(Competency.code)
-        .all()
-    )
-    
+def department_performance(department: Department, competency_stats) -> Dict[str, Any]:
+    """Ranked competency stats and overall averages for one department."""
     # Format department competency stats
     competencies_list = []
     
@@ -211,7 +246,7 @@ def get_competency_by_department_stats(
             "competency_name": comp_stat.name,
             "description": comp_stat.description,
             "required_score": comp_stat.required_score,
-            "average_score": round(comp_stat.average_score, 2),
+            "average_score": round(average_score(comp_stat) or 0, 2),
             "fulfillment_rate": round(fulfillment_rate, 2),
             "employees_evaluated": comp_stat.total_evaluations,
             "employees_meeting_required": comp_stat.meeting_required
@@ -232,14 +267,118 @@ def get_competency_by_department_stats(
         avg_score = 0
         avg_fulfillment = 0
         
-    result[department.department_code] = {
+    return {
         "department_name": department.name,
         "overall_average_score": round(avg_score, 2),
         "overall_fulfillment_rate": round(avg_fulfillment, 2),
         "competencies": competencies_list
     }
+
+
+@router.get("/stats/department-performance", response_model=Dict[str, Any], dependencies=[conditional_get(*DEPARTMENT_STATS_TABLES)])
+async def get_all_departments_performance(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Department performance statistics for every department in one call,
+    keyed by department code like /stats/department-performance/{department_code}.
+    """
+    role =current_user["role"] 
+    if role not in ["HR","ADMIN"]:
+        raise HTTPException(status_code=401, detail="No access")  
+
+    key = stats_cache.key("department-performance", {}, role)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # One grouped read of the (department, competency) rollup, ordered by department
+    totals = await db.run_sync(department_competency_totals)
+    stats_by_department = {
+        department_code: list(rows)
+        for department_code, rows in groupby(totals, key=lambda r: r.department_code)
+    }
+
+    departments = (await db.execute(select(Department).order_by(Department.department_code))).scalars().all()
+    result = {}
+    for department in departments:
+        result[department.department_code] = department_performance(
+            department, stats_by_department.get(department.department_code, [])
+        )
+
+    return stats_cache.store(key, result)
+
+
+@router.get("/stats/department-performance/{department_code}", response_model=Dict[str, Any], dependencies=[conditional_get(*DEPARTMENT_STATS_TABLES)])
+async def get_competency_by_department_stats(
+    department_code: str,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: dict = Depends(get_current_user)
+
+):
+    role =current_user["role"] 
+    if role not in ["HR","ADMIN"]:
+        raise HTTPException(status_code=401, detail="No access")  
+    """
+    Get department performance statistics showing all competencies
+    for a specific department with rankings.
+    """
+    key = stats_cache.key("department-performance", {"department_code": department_code}, role)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Verify department exists
+    department = (await db.execute(
+        select(Department).where(Department.department_code == department_code)
+    )).scalars().first()
+    if not department:
+        raise HTTPException(status_code=404, detail=f"Department with code {department_code} not found")
+    
+    # Per-competency totals for this department come from the rollup table
+    competency_stats = await db.run_sync(competency_totals, department_code=department_code)
     
-    return result
+    result = {department.department_code: department_performance(department, competency_stats)}
+    
+    return stats_cache.store(key, result)
+
+
+
+
+
+@router.get("/stats/distributions", dependencies=[conditional_get(*STATS_TABLES)])
+async def get_score_distributions(
+    group_by: str = Query("competency", description="Comma separated keys: employee, department, role, competency"),
+    metric: str = Query("actual", description="actual or gap"),
+    replica: Optional[Replica] = Depends(choose_replica),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Score histograms, medians, p10/p90 and standard deviations per group,
+    computed with vectorized NumPy operations over the cached score arrays.
+    """
+    role =current_user["role"] 
+    if role not in ["HR","ADMIN"]:
+        raise HTTPException(status_code=401, detail="No access")  
+
+    keys = parse_group_by(group_by)
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(METRICS)}")
+
+    key = stats_cache.key("distributions", {"group_by": ",".join(keys), "metric": metric}, role)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Loading and the NumPy work are both blocking, keep them off the event loop
+    frame = await run_in_threadpool(score_frame, replica.engine if replica else None)
+    groups = await run_in_threadpool(score_distributions, frame, keys, metric)
+    return stats_cache.store(key, {
+        "group_by": keys,
+        "metric": metric,
+        "groups": groups
+    })
 
 
 
@@ -259,8 +398,8 @@ class OverallCompetencyPerformance(BaseModel):
 
 
 
-@router.get("/stats/overall-competency-performance", response_model=List[OverallCompetencyPerformance])
-def get_overall_competency_performance(db: Session = Depends(get_db),
+@router.get("/stats/overall-competency-performance", response_model=List[OverallCompetencyPerformance], dependencies=[conditional_get(*STATS_TABLES)])
+async def get_overall_competency_performance(db: AsyncSession = Depends(get_async_read_db),
     current_user: dict = Depends(get_current_user)):
     
     role =current_user["role"] 
@@ -270,35 +409,19 @@ def get_overall_competency_performance(db: Session = Depends(get_db),
     Get overall competency performance statistics ranked from best to worst performing
     across the entire organization.
     """
-    # Query to calculate statistics for each competency across all departments
-    competency_stats = (
-        db.query(
-            Competency.code,
-            Competency.name,
-            Competency.description,
-            Competency.required_score,
-            func.avg(EmployeeCompetency.actual_score).label("average_score"),
-            func.count(EmployeeCompetency.id).label("total_evaluations"),
-            func.sum(
-                case(
-                    (EmployeeCompetency.actual_score >= EmployeeCompetency.required_score, 1),
-                    else_=0
-                )
-            ).label("meeting_required")
-        )
-        .join(
-            EmployeeCompetency,
-            EmployeeCompetency.competency_code == Competency.code
-        )
-        .group_by(Competency.code)
-        .all()
-    )
+    key = stats_cache.key("overall-competency-performance", {}, role)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Totals for each competency across all departments, summed from the rollup table
+    competency_stats = await db.run_sync(competency_totals)
     
     # Process and rank the results 
     result = []
     
     for comp_stat in competency_stats:
-        avg_score = comp_stat.average_score or 0
+        avg_score = average_score(comp_stat) or 0
         fulfillment_rate = (comp_stat.meeting_required / comp_stat.total_evaluations * 100) if comp_stat.total_evaluations > 0 else 0
         performance_gap = avg_score - comp_stat.required_score
         
@@ -337,4 +460,4 @@ def get_overall_competency_performance(db: Session = Depends(get_db),
         )
     
     
-    return ranked_result
+    return stats_cache.store(key, ranked_result)
@@ -0,0 +1,163 @@
+import re
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+from models import Competency, CompetencyDepartmentRollup, Employee, EmployeeCompetency
+from statsRollup import ROLLUP_GAP_BUCKETS
+
+
+DEFAULT_GAP_BUCKETS = "1,2,3"
+
+# (label, lowest gap, highest gap or None for open ended)
+GapBucket = Tuple[str, int, Optional[int]]
+
+
+def parse_gap_buckets(spec: str) -> List[GapBucket]:
+    """
+    Parse a bucket spec like "1,2,3,4+" or "1,2-3,4+" into gap buckets.
+    "N" is an exact gap, "N-M" an inclusive range and "N+" everything from N up.
+    In a query string "+" must be sent as %2B, an unescaped one arrives as a space.
+    """
+    buckets = []
+    parts = spec.split(",")
+    for i, raw in enumerate(parts):
+        part = raw.strip()
+        if not part:
+            continue
+        # Only the last bucket can be open ended, a trailing "4 " there is
+        # almost always "4+" sent unescaped: refuse rather than guess
+        if i == len(parts) - 1 and re.fullmatch(r"\s*\d+ +", raw):
+            raise HTTPException(status_code=400, detail=f'Invalid gap bucket "{raw}": send "+" as %2B')
+        match = re.fullmatch(r"(\d+)(?:(\+)|-(\d+))?", part)
+        if not match:
+            raise HTTPException(status_code=400, detail=f"Invalid gap buckets: {spec}")
+        low = int(match.group(1))
+        if match.group(2):
+            buckets.append((f"gap{low}plus", low, None))
+        elif match.group(3) is not None:
+            high = int(match.group(3))
+            if high < low:
+                raise HTTPException(status_code=400, detail=f"Invalid gap buckets: {spec}")
+            buckets.append((f"gap{low}to{high}", low, high))
+        else:
+            buckets.append((f"gap{low}", low, low))
+
+    if not buckets:
+        raise HTTPException(status_code=400, detail="At least one gap bucket is required")
+
+    # Buckets must not overlap, otherwise totalGapEmployees double counts
+    ordered = sorted(buckets, key=lambda b: b[1])
+    for prev, nxt in zip(ordered, ordered[1:]):
+        if prev[2] is None or prev[2] >= nxt[1]:
+            raise HTTPException(status_code=400, detail=f"Overlapping gap buckets: {spec}")
+    if any(low < 1 for _, low, _ in buckets):
+        raise HTTPException(status_code=400, detail="Gap buckets must start at 1 or higher")
+
+    return buckets
+
+
+def gap_bucket_condition(gap, bucket: GapBucket):
+    _, low, high = bucket
+    if high is None:
+        return gap >= low
+    if low == high:
+        return gap == low
+    return and_(gap >= low, gap <= high)
+
+
+def rollup_columns(bucket: GapBucket) -> Optional[List[str]]:
+    """Rollup gap columns that add up to exactly this bucket, or None if it can't be served from the rollup."""
+    _, low, high = bucket
+    if low not in (1, 2, 3, 4):
+        return None
+    if high is not None and (high > 3 or low == 4):
+        return None
+    return [
+        column for column, column_low, _ in ROLLUP_GAP_BUCKETS
+        if column_low >= low and (high is None or column_low <= high)
+    ]
+
+
+def _rollup_gap_counts(db: Session, buckets: List[GapBucket], department_code: Optional[str]):
+    columns = [rollup_columns(bucket) for bucket in buckets]
+    if any(c is None for c in columns):
+        return None
+
+    counts = db.query(
+        CompetencyDepartmentRollup.competency_code.label("competency_code"),
+        *[
+            func.sum(sum(getattr(CompetencyDepartmentRollup, c) for c in bucket_cols)).label(bucket[0])
+            for bucket, bucket_cols in zip(buckets, columns)
+        ]
+    )
+    if department_code:
+        counts = counts.filter(CompetencyDepartmentRollup.department_code == department_code)
+    return counts.group_by(CompetencyDepartmentRollup.competency_code).subquery()
+
+
+def _employee_competency_gap_counts(
+    db: Session,
+    buckets: List[GapBucket],
+    department_code: Optional[str],
+    role_code: Optional[str],
+):
+    gap = EmployeeCompetency.required_score - EmployeeCompetency.actual_score
+
+    counts = (
+        db.query(
+            EmployeeCompetency.competency_code.label("competency_code"),
+            *[
+                func.sum(case((gap_bucket_condition(gap, bucket), 1), else_=0)).label(bucket[0])
+                for bucket in buckets
+            ]
+        )
+        .filter(
+            EmployeeCompetency.required_score.isnot(None),
+            EmployeeCompetency.actual_score.isnot(None)
+        )
+    )
+    if department_code or role_code:
+        counts = counts.join(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
+        if department_code:
+            counts = counts.filter(Employee.department_code == department_code)
+        if role_code:
+            counts = counts.filter(Employee.role_code == role_code)
+    return counts.group_by(EmployeeCompetency.competency_code).subquery()
+
+
+def competency_gap_histogram(
+    db: Session,
+    buckets: List[GapBucket],
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+) -> List[dict]:
+    """
+    Count employees per gap bucket for every competency in a single grouped query.
+    Competencies without any matching rows are still listed with zero counts.
+    Bucket layouts the rollup table can answer are read from it when no role filter is given.
+    """
+    counts = None
+    if not role_code:
+        counts = _rollup_gap_counts(db, buckets, department_code)
+    if counts is None:
+        counts = _employee_competency_gap_counts(db, buckets, department_code, role_code)
+
+    bucket_columns = [func.coalesce(counts.c[label], 0) for label, _, _ in buckets]
+    total = sum(bucket_columns[1:], bucket_columns[0])
+
+    rows = (
+        db.query(Competency.code, Competency.name, *bucket_columns, total.label("total"))
+        .outerjoin(counts, counts.c.competency_code == Competency.code)
+        .order_by(total.desc(), Competency.id)
+        .all()
+    )
+
+    result = []
+    for row in rows:
+        entry = {"competencyCode": row[0], "competencyName": row[1]}
+        for (label, _, _), value in zip(buckets, row[2:-1]):
+            entry[label] = value
+        entry["totalGapEmployees"] = row[-1]
+        result.append(entry)
+    return result
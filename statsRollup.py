@@ -0,0 +1,216 @@
+from collections import defaultdict
+from typing import Iterable, Optional
+from sqlalchemy import and_, case, delete, func, insert, update
+from sqlalchemy.orm import Session
+from models import Competency, CompetencyDepartmentRollup, Employee, EmployeeCompetency
+
+
+# Counter columns of CompetencyDepartmentRollup, in the order RollupDelta tracks them
+ROLLUP_COUNTERS = [
+    "employee_count",
+    "scored_count",
+    "score_sum",
+    "meeting_required",
+    "gap1",
+    "gap2",
+    "gap3",
+    "gap4_plus",
+]
+
+# Gap buckets stored in the rollup as (column, lowest gap, highest gap or None)
+ROLLUP_GAP_BUCKETS = [("gap1", 1, 1), ("gap2", 2, 2), ("gap3", 3, 3), ("gap4_plus", 4, None)]
+
+
+def _contribution(required_score, actual_score):
+    required = int(required_score) if required_score is not None else None
+    actual = int(actual_score) if actual_score is not None else None
+
+    values = dict.fromkeys(ROLLUP_COUNTERS, 0)
+    values["employee_count"] = 1
+    if actual is not None:
+        values["scored_count"] = 1
+        values["score_sum"] = actual
+    if required is not None and actual is not None:
+        if actual >= required:
+            values["meeting_required"] = 1
+        gap = required - actual
+        for column, low, high in ROLLUP_GAP_BUCKETS:
+            if gap >= low and (high is None or gap <= high):
+                values[column] = 1
+    return [values[c] for c in ROLLUP_COUNTERS]
+
+
+class RollupDelta:
+    """
+    Collects the changes a write makes to employee_competencies and applies
+    them to the rollup table in the same transaction.
+
+    Call remove() with the old values of a row and add() with the new ones,
+    then apply(db) before db.commit().
+    """
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: [0] * len(ROLLUP_COUNTERS))
+
+    def add(self, competency_code: str, department_code: Optional[str], required_score, actual_score, sign: int = 1):
+        totals = self.changes[(competency_code, department_code)]
+        for i, value in enumerate(_contribution(required_score, actual_score)):
+            totals[i] += sign * value
+
+    def remove(self, competency_code: str, department_code: Optional[str], required_score, actual_score):
+        self.add(competency_code, department_code, required_score, actual_score, sign=-1)
+
+    def apply(self, db: Session):
+        for (competency_code, department_code), totals in self.changes.items():
+            if not any(totals):
+                continue
+
+            if department_code is None:
+                department_filter = CompetencyDepartmentRollup.department_code.is_(None)
+            else:
+                department_filter = CompetencyDepartmentRollup.department_code == department_code
+
+            # Relative updates so concurrent writers don't overwrite each other's totals
+            updated = db.execute(
+                update(CompetencyDepartmentRollup)
+                .where(
+                    CompetencyDepartmentRollup.competency_code == competency_code,
+                    department_filter
+                )
+                .values({
+                    column: getattr(CompetencyDepartmentRollup, column) + value
+                    for column, value in zip(ROLLUP_COUNTERS, totals)
+                })
+                .execution_options(synchronize_session=False)
+            )
+            if updated.rowcount == 0:
+                db.execute(
+                    insert(CompetencyDepartmentRollup).values(
+                        competency_code=competency_code,
+                        department_code=department_code,
+                        **dict(zip(ROLLUP_COUNTERS, totals))
+                    )
+                )
+        self.changes.clear()
+
+
+def employee_competency_rows(db: Session, employee_number: str):
+    """(competency_code, required_score, actual_score) for every competency of an employee."""
+    return db.query(
+        EmployeeCompetency.competency_code,
+        EmployeeCompetency.required_score,
+        EmployeeCompetency.actual_score
+    ).filter(EmployeeCompetency.employee_number == employee_number).all()
+
+
+def remove_employee_rows(delta: RollupDelta, department_code: Optional[str], rows: Iterable):
+    for row in rows:
+        delta.remove(row.competency_code, department_code, row.required_score, row.actual_score)
+
+
+def competency_totals_query(db: Session, department_code: Optional[str] = None):
+    """
+    Per-competency totals read from the rollup table, optionally for one department.
+    Competencies nobody is assigned to are left out, like the inner join they replace.
+    """
+    rollup = CompetencyDepartmentRollup
+    query = (
+        db.query(
+            Competency.code,
+            Competency.name,
+            Competency.description,
+            Competency.required_score,
+            func.sum(rollup.employee_count).label("total_evaluations"),
+            func.sum(rollup.scored_count).label("scored_count"),
+            func.sum(rollup.score_sum).label("score_sum"),
+            func.sum(rollup.meeting_required).label("meeting_required"),
+        )
+        .join(rollup, rollup.competency_code == Competency.code)
+    )
+    if department_code is not None:
+        query = query.filter(rollup.department_code == department_code)
+    return (
+        query.group_by(Competency.id)
+        .having(func.sum(rollup.employee_count) > 0)
+        .order_by(Competency.code)
+    )
+
+
+def competency_totals(db: Session, department_code: Optional[str] = None):
+    return competency_totals_query(db, department_code).all()
+
+
+def department_competency_totals_query(db: Session):
+    """
+    Per-(department, competency) totals for all departments in one grouped read,
+    ordered by department so callers can group the rows.
+    """
+    rollup = CompetencyDepartmentRollup
+    return (
+        db.query(
+            rollup.department_code,
+            Competency.code,
+            Competency.name,
+            Competency.description,
+            Competency.required_score,
+            func.sum(rollup.employee_count).label("total_evaluations"),
+            func.sum(rollup.scored_count).label("scored_count"),
+            func.sum(rollup.score_sum).label("score_sum"),
+            func.sum(rollup.meeting_required).label("meeting_required"),
+        )
+        .join(rollup, rollup.competency_code == Competency.code)
+        .filter(rollup.department_code.isnot(None))
+        .group_by(rollup.department_code, Competency.id)
+        .having(func.sum(rollup.employee_count) > 0)
+        .order_by(rollup.department_code, Competency.code)
+    )
+
+
+def department_competency_totals(db: Session):
+    return department_competency_totals_query(db).all()
+
+
+def average_score(totals) -> Optional[float]:
+    return totals.score_sum / totals.scored_count if totals.scored_count else None
+
+
+def rebuild_rollups(db: Session) -> int:
+    """Recompute the whole rollup table from employee_competencies. Returns the number of rollup rows."""
+    required = EmployeeCompetency.required_score
+    actual = EmployeeCompetency.actual_score
+    gap = required - actual
+    both_scored = and_(required.isnot(None), actual.isnot(None))
+
+    def bucket(low, high):
+        in_bucket = gap >= low if high is None else and_(gap >= low, gap <= high)
+        return func.sum(case((and_(both_scored, in_bucket), 1), else_=0))
+
+    aggregate = (
+        db.query(
+            EmployeeCompetency.competency_code,
+            Employee.department_code,
+            func.count(EmployeeCompetency.id),
+            func.count(actual),
+            func.coalesce(func.sum(actual), 0),
+            func.sum(case((and_(both_scored, actual >= required), 1), else_=0)),
+            *[bucket(low, high) for _, low, high in ROLLUP_GAP_BUCKETS]
+        )
+        .outerjoin(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
+        .group_by(EmployeeCompetency.competency_code, Employee.department_code)
+    )
+
+    db.execute(delete(CompetencyDepartmentRollup))
+    db.execute(
+        insert(CompetencyDepartmentRollup).from_select(
+            ["competency_code", "department_code", *ROLLUP_COUNTERS],
+            aggregate.statement
+        )
+    )
+    db.commit()
+    return db.query(CompetencyDepartmentRollup).count()
+
+
+def ensure_rollups(db: Session):
+    """Build the rollups once for databases created before the rollup table existed."""
+    if db.query(CompetencyDepartmentRollup.id).first() is None and db.query(EmployeeCompetency.id).first() is not None:
+        rebuild_rollups(db)
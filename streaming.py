@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, List, Optional, Union
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Query, Session
+from database import AsyncSessionLocal, SessionLocal
+
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Rows per worksheet Excel can open, header included; longer exports continue on a new sheet
+XLSX_MAX_ROWS = 1048576
+
+
+def negotiate_format(request: Request, requested: Optional[str]) -> str:
+    """Pick json, ndjson or csv from ?format= first, then from the Accept header."""
+    if requested:
+        requested = requested.lower()
+        if requested not in ("json", "ndjson", "csv"):
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {requested}")
+        return requested
+
+    accept = request.headers.get("accept", "")
+    if "application/x-ndjson" in accept or "application/ndjson" in accept:
+        return "ndjson"
+    if "text/csv" in accept:
+        return "csv"
+    return "json"
+
+
+def iter_query_rows(build_query: Callable[[Session], Query], batch_size: int = STREAM_BATCH_SIZE, bind=None) -> Iterator:
+    """
+    Run a query in its own session and yield rows batch by batch.
+
+    The request's session from get_db is already closed by the time a
+    StreamingResponse body is sent, so streaming opens its own. bind picks
+    another engine, e.g. a replica.
+    """
+    db = SessionLocal(bind=bind) if bind is not None else SessionLocal()
+    try:
+        for row in build_query(db).yield_per(batch_size):
+            yield row
+    finally:
+        db.close()
+
+
+async def aiter_query_rows(build_query: Callable[[Session], Query], batch_size: int = STREAM_BATCH_SIZE, bind=None) -> AsyncIterator:
+    """
+    Async counterpart of iter_query_rows. The query is built on the session's
+    sync facade (building it does no I/O) and streamed from a server-side
+    cursor with AsyncSession.stream. bind picks another engine, e.g. a replica.
+    """
+    async with (AsyncSessionLocal(bind=bind) if bind is not None else AsyncSessionLocal()) as db:
+        statement = build_query(db.sync_session).statement.execution_options(yield_per=batch_size)
+        result = await db.stream(statement)
+        async for partition in result.partitions():
+            for row in partition:
+                yield row
+
+
+def _chunked(lines: Iterable[str], batch_size: int) -> Iterator[bytes]:
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= batch_size:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+async def _achunked(records: AsyncIterable[dict], render: Callable[[Iterable[dict]], Iterator[str]], batch_size: int) -> AsyncIterator[bytes]:
+    # Render each batch of records with the sync line writers
+    batch = []
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield "".join(render(batch)).encode("utf-8")
+            batch = []
+    if batch:
+        yield "".join(render(batch)).encode("utf-8")
+
+
+def ndjson_lines(records: Iterable[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, default=str) + "\n"
+
+
+def csv_lines(records: Iterable[dict], fieldnames: List[str], header: bool = True) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _async_body(records: AsyncIterable[dict], output_format: str, fieldnames: List[str], batch_size: int) -> AsyncIterator[bytes]:
+    if output_format != "csv":
+        return _achunked(records, ndjson_lines, batch_size)
+
+    async def with_header():
+        yield "".join(csv_lines([], fieldnames)).encode("utf-8")
+        async for chunk in _achunked(records, lambda batch: csv_lines(batch, fieldnames, header=False), batch_size):
+            yield chunk
+
+    return with_header()
+
+
+def streaming_response(
+    records: Union[Iterable[dict], AsyncIterable[dict]],
+    output_format: str,
+    fieldnames: List[str],
+    filename: Optional[str] = None,
+    batch_size: int = STREAM_BATCH_SIZE,
+    headers: Optional[dict] = None,
+) -> StreamingResponse:
+    """
+    Stream records as NDJSON or CSV, writing a chunk to the socket every
+    batch_size rows. records can be a sync or an async iterable.
+    """
+    if hasattr(records, "__aiter__"):
+        body = _async_body(records, output_format, fieldnames, batch_size)
+    elif output_format == "csv":
+        body = _chunked(csv_lines(records, fieldnames), batch_size)
+    else:
+        body = _chunked(ndjson_lines(records), batch_size)
+
+    headers = dict(headers or {})
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}.{output_format}"'
+    return StreamingResponse(
+        body,
+        media_type=STREAM_MEDIA_TYPES[output_format],
+        headers=headers
+    )
+
+
+def write_xlsx(records: Iterable[dict], fieldnames: List[str], sheet_title: str) -> str:
+    """
+    Write records to a temporary .xlsx file and return its path. openpyxl's
+    write_only mode streams rows to disk, so memory stays flat however many
+    rows there are.
+    """
+    from openpyxl import Workbook
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="export-")
+    os.close(fd)
+    try:
+        workbook = Workbook(write_only=True)
+        worksheet = None
+        rows = XLSX_MAX_ROWS
+        for record in records:
+            if rows >= XLSX_MAX_ROWS:
+                title = sheet_title if worksheet is None else f"{sheet_title} ({len(workbook.worksheets) + 1})"
+                worksheet = workbook.create_sheet(title[:31])
+                worksheet.append(fieldnames)
+                rows = 1
+            worksheet.append([record.get(field) for field in fieldnames])
+            rows += 1
+        if worksheet is None:
+            workbook.create_sheet(sheet_title[:31]).append(fieldnames)
+        workbook.save(path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+async def xlsx_response(records: Iterable[dict], fieldnames: List[str], filename: str) -> FileResponse:
+    """Build the workbook off the event loop and send it, removing the file afterwards."""
+    path = await run_in_threadpool(write_xlsx, records, fieldnames, filename)
+    return FileResponse(
+        path,
+        media_type=XLSX_MEDIA_TYPE,
+        filename=f"{filename}.xlsx",
+        background=BackgroundTask(os.remove, path)
+    )
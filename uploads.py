@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Iterator
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+# Largest request body accepted, uploads included (default 50 MB)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+# Where uploads are copied when another process has to open them, the
+# system temp dir when unset
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+
+UPLOAD_COPY_CHUNK = 1024 * 1024
+
+
+def _too_large(max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    return f"File too large, the limit is {max_bytes} bytes"
+
+
+class LimitUploadSize:
+    """
+    ASGI middleware rejecting request bodies over max_bytes with a 413.
+    Content-Length is checked before anything is read; chunked bodies have
+    none, so bytes are also counted as they are received. Add it before
+    CORSMiddleware so the 413 gets CORS headers like any other response.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": _too_large(self.max_bytes)})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                # Raised while the endpoint reads its body, FastAPI answers it
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=_too_large(self.max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def detach_upload(file: UploadFile) -> IO[bytes]:
+    """
+    A handle on an upload's data that stays open after the request, for work
+    that outlives it. Starlette has already spooled the upload to a temporary
+    file, so this moves it to disk if it was small enough to stay in memory
+    and duplicates the descriptor instead of copying the data. The caller
+    closes the handle; the data goes with it.
+    """
+    file.file.rollover()
+    handle = os.fdopen(os.dup(file.file.fileno()), "rb")
+    handle.seek(0)
+    return handle
+
+
+@contextmanager
+def upload_path(source: IO[bytes]) -> Iterator[str]:
+    """
+    A named copy of an upload for other processes to open, removed on exit.
+    Uploads are otherwise read where Starlette spooled them.
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="upload-", dir=UPLOAD_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as target:
+            source.seek(0)
+            shutil.copyfileobj(source, target, UPLOAD_COPY_CHUNK)
+        yield path
+    finally:
+        os.remove(path)